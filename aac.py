@@ -1,89 +1,52 @@
 import os
-import numpy as np
-from PIL import Image
 import pygame
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from seq2anim import EXTENSIONS, Converter, GridSpec, Sheet, SheetCache, Tracer, default_converter
 
 # ========== 可调参数 ==========
 input_folder = "/Users/nayuchuanmei/Documents/[需要处理的]"  # 输入文件夹路径
 output_folder = "output"  # 输出文件夹路径
 fps = 12  # 动画帧率
-format = "webp"  # 可选 "webp" 或 "apng"
+format = "webp"  # 可选 "webp"、"apng" 或 "gif"
 alpha_threshold = 28  # alpha 阈值 (0-255)
 max_rows = 20  # 最大行分割数
 max_cols = 20  # 最大列分割数
 debug = True  # 是否打印调试信息
+encode_workers = None  # WebP/APNG 并行编码线程数（None 为 CPU 核数）
+alpha_cleanup = None  # 编码前清理透明像素: None / "zero"（RGB清零）/ "bleed"（填充相邻颜色）
 preview_max_size = (1200, 800)  # 预览窗口最大尺寸
+sheet_cache_mb = 8192  # 解码后序列图的磁盘缓存上限 (MB)，0 为关闭（目录见 SEQ2ANIM_CACHE）
+latency_hud = False  # 在窗口左上角显示最近一次操作的分步耗时和帧间隔
+trace_file = None  # 写出 Chrome trace 文件（如 "aac_trace.json"），可用 chrome://tracing 或 Perfetto 打开
+auto_workers = 4  # 第一阶段同时自动分割的图片数
+review_prefetch = 2  # 第二阶段人工确认时提前解码的图片数
 # ==============================
 
+sheet_cache = SheetCache(max_bytes=sheet_cache_mb * 2 ** 20) if sheet_cache_mb else None
+tracer = Tracer(trace_file, latency_hud)
+
 os.makedirs(output_folder, exist_ok=True)
 
 
-def detect_max_rows(img, max_rows, alpha_threshold):
-    """从最大行开始递减，找到每行上下边缘都透明的最大行数"""
-    w, h = img.size
-    arr = np.array(img)
-
-    for rows in range(max_rows, 0, -1):
-        frame_h = h // rows
-        all_clear = True
-        for i in range(rows):
-            top = arr[i * frame_h, :, 3]
-            bottom = arr[(i + 1) * frame_h - 1, :, 3]
-            if np.any(top >= alpha_threshold) or np.any(bottom >= alpha_threshold):
-                all_clear = False
-                if debug:
-                    print(f"行检测失败: rows={rows}, 切片{i}, top/bottom有不透明像素")
-                break
-        if all_clear:
-            if debug:
-                print(f"✅ 最大有效行数: {rows}")
-            return rows
-    if debug:
-        print("⚠️ 找不到符合条件的行，默认1行")
-    return 1
-
-
-def detect_max_cols(img, max_cols, alpha_threshold, rows):
-    """从最大列开始递减，找到每列左右边缘都透明的最大列数"""
-    w, h = img.size
-    arr = np.array(img)
-
-    for cols in range(max_cols, 0, -1):
-        frame_w = w // cols
-        all_clear = True
-        for j in range(cols):
-            left = arr[:, j * frame_w, 3]
-            right = arr[:, (j + 1) * frame_w - 1, 3]
-            for i in range(rows):
-                slice_top = i * (h // rows)
-                slice_bottom = (i + 1) * (h // rows)
-                if np.any(left[slice_top:slice_bottom] >= alpha_threshold) or np.any(
-                        right[slice_top:slice_bottom] >= alpha_threshold):
-                    all_clear = False
-                    if debug:
-                        print(f"列检测失败: cols={cols}, 切片({i},{j}), left/right有不透明像素")
-                    break
-            if not all_clear:
-                break
-        if all_clear:
-            if debug:
-                print(f"✅ 最大有效列数: {cols}")
-            return cols
-    if debug:
-        print("⚠️ 找不到符合条件的列，默认1列")
-    return 1
-
+def auto_split_and_animate(filepath, encoder=None):
+    """自动分割并生成动画
 
-def auto_split_and_animate(filepath):
-    """自动分割并生成动画"""
-    img = Image.open(filepath).convert("RGBA")
-    w, h = img.size
+    encoder 为多个线程共用编码线程池的 Converter；检测仍用本线程的默认转换器（掩码缓冲区不能跨线程共用）。
+    """
+    converter = default_converter(encode_workers)
+    encoder = encoder or converter
+    sheet = Sheet.open(filepath, cache=sheet_cache)
+    if alpha_cleanup:
+        cleaned = sheet.cleanup(alpha_threshold, alpha_cleanup)
+        if debug:
+            print(f"🧹 {os.path.basename(filepath)}: 清理 {cleaned} 个透明像素")
+    w, h = sheet.size
     if debug:
         print(f"\n处理文件: {filepath}, 尺寸: {w}x{h}")
 
-    rows = detect_max_rows(img, max_rows, alpha_threshold)
-    cols = detect_max_cols(img, max_cols, alpha_threshold, rows)
+    rows, cols = converter.detect(sheet, max_rows, max_cols, alpha_threshold, debug=debug)
 
     if debug:
         print(f"自动分割结果: {cols} 列 x {rows} 行")
@@ -94,46 +57,15 @@ def auto_split_and_animate(filepath):
             print(f"⚠️ 自动分割结果不理想（{cols}列×{rows}行），需要手动分割")
         return False, rows, cols
 
-    frame_w = w // cols
-    frame_h = h // rows
-
-    frames = []
-    for y in range(rows):
-        for x in range(cols):
-            box = (x * frame_w, y * frame_h, (x + 1) * frame_w, (y + 1) * frame_h)
-            frame = img.crop(box)
-            arr = np.array(frame)
-            if np.all(arr[..., 3] == 0):  # 跳过完全透明帧
-                continue
-            frames.append(frame)
+    frames = sheet.split(GridSpec(rows, cols))
 
-    if not frames:
+    if not len(frames):
         print(f"⚠️ 跳过 {os.path.basename(filepath)}（无有效帧）")
         return False, rows, cols
 
-    duration = int(1000 / fps)
     filename = os.path.splitext(os.path.basename(filepath))[0]
-    outpath = os.path.join(output_folder, f"{filename}.{'webp' if format == 'webp' else 'png'}")
-
-    if format == "webp":
-        frames[0].save(
-            outpath,
-            save_all=True,
-            append_images=frames[1:],
-            duration=duration,
-            loop=0,
-            disposal=2,
-            lossless=True
-        )
-    else:
-        # 对于APNG格式，这里简化处理
-        frames[0].save(
-            outpath,
-            save_all=True,
-            append_images=frames[1:],
-            duration=duration,
-            loop=0
-        )
+    outpath = os.path.join(output_folder, f"{filename}.{EXTENSIONS[format]}")
+    frames.save(outpath, format, fps, loop=0, workers=encoder.workers, executor=encoder.executor)
 
     print(f"✅ {filename}: {cols}x{rows} 网格 → {len(frames)}帧，{fps}fps → {outpath}")
     return True, rows, cols
@@ -144,23 +76,56 @@ class ManualImageSplitter:
         self.input_folder = input_folder
         self.output_folder = output_folder
         self.image_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.png')]
+        self.initial_grids = {}  # 文件名 → 自动分割结果 (rows, cols)
+        self.prefetched = {}  # 下标 → 预取中的 Future
+        self.loader = ThreadPoolExecutor(max_workers=1)  # 预取线程：在人工确认当前图片时解码后面的图片
+        self.saver = ThreadPoolExecutor(max_workers=1)  # 保存线程：确认后立即切到下一张，编码在后台进行
+        self.pending_saves = []
         self.current_index = 0
         self.rows = 1
         self.cols = 1
+        self.sheet = None
         self.original_image = None
         self.preview_image = None
         self.scaled_preview = None
         self.scale_factor = 1.0
+        self.frame_count = 0
         self.screen = None
         self.font = None
 
+    def open_sheet(self, filename):
+        """解码、清理并建积分图；在预取线程中运行，返回 (Sheet, 清理的像素数)"""
+        with tracer.span("prefetch"):
+            with tracer.span("decode"):
+                sheet = Sheet.open(os.path.join(self.input_folder, filename), cache=sheet_cache)
+            cleaned = None
+            if alpha_cleanup:
+                with tracer.span("cleanup"):
+                    cleaned = sheet.cleanup(alpha_threshold, alpha_cleanup)
+            with tracer.span("occupancy"):
+                sheet.occupancy(alpha_threshold)  # 按检测阈值只建一张积分图，之后改行列时有效帧数只需查表
+        return sheet, cleaned
+
+    def prefetch(self, start):
+        """提交 [start, start + review_prefetch] 中还没有开始的预取"""
+        for index in range(start, min(start + review_prefetch + 1, len(self.image_files))):
+            if index not in self.prefetched:
+                self.prefetched[index] = self.loader.submit(self.open_sheet, self.image_files[index])
+
     def load_current_image(self):
         if self.current_index >= len(self.image_files):
             return False
 
-        filepath = os.path.join(self.input_folder, self.image_files[self.current_index])
-        self.original_image = Image.open(filepath).convert("RGBA")
-        self.update_preview()
+        filename = self.image_files[self.current_index]
+        with tracer.span("load_image"):
+            with tracer.span("wait_prefetch"):
+                future = self.prefetched.pop(self.current_index, None)
+                self.sheet, cleaned = future.result() if future else self.open_sheet(filename)
+            self.prefetch(self.current_index + 1)
+            if cleaned is not None and debug:
+                print(f"🧹 {filename}: 清理 {cleaned} 个透明像素")
+            self.original_image = self.sheet.image
+            self.update_preview()
         return True
 
     def calculate_scale_factor(self, img_size):
@@ -179,35 +144,43 @@ class ManualImageSplitter:
         if self.original_image is None:
             return
 
-        w, h = self.original_image.size
+        with tracer.span("update_preview"):
+            w, h = self.original_image.size
+
+            # 计算缩放比例
+            self.calculate_scale_factor((w, h))
+            scaled_w = int(w * self.scale_factor)
+            scaled_h = int(h * self.scale_factor)
 
-        # 计算缩放比例
-        self.calculate_scale_factor((w, h))
-        scaled_w = int(w * self.scale_factor)
-        scaled_h = int(h * self.scale_factor)
+            # 创建带网格线的预览图像
+            with tracer.span("copy"):
+                preview = self.original_image.copy()
 
-        # 创建带网格线的预览图像
-        preview = self.original_image.copy()
+            # 转换为Pygame可用的格式
+            with tracer.span("to_surface"):
+                preview_rgb = preview.convert("RGB")
+                preview_surface = pygame.image.fromstring(preview_rgb.tobytes(), preview_rgb.size, preview_rgb.mode)
 
-        # 转换为Pygame可用的格式
-        preview_rgb = preview.convert("RGB")
-        preview_surface = pygame.image.fromstring(preview_rgb.tobytes(), preview_rgb.size, preview_rgb.mode)
+            # 绘制网格线到原尺寸图像
+            with tracer.span("grid"):
+                grid_surface = pygame.Surface((w, h), pygame.SRCALPHA)
+                frame_w = w // self.cols
+                frame_h = h // self.rows
 
-        # 绘制网格线到原尺寸图像
-        grid_surface = pygame.Surface((w, h), pygame.SRCALPHA)
-        frame_w = w // self.cols
-        frame_h = h // self.rows
+                for i in range(1, self.rows):
+                    pygame.draw.line(grid_surface, (255, 0, 0, 128), (0, i * frame_h), (w, i * frame_h), 2)
+                for j in range(1, self.cols):
+                    pygame.draw.line(grid_surface, (255, 0, 0, 128), (j * frame_w, 0), (j * frame_w, h), 2)
 
-        for i in range(1, self.rows):
-            pygame.draw.line(grid_surface, (255, 0, 0, 128), (0, i * frame_h), (w, i * frame_h), 2)
-        for j in range(1, self.cols):
-            pygame.draw.line(grid_surface, (255, 0, 0, 128), (j * frame_w, 0), (j * frame_w, h), 2)
+                # 将网格线合成到预览图像上
+                preview_surface.blit(grid_surface, (0, 0))
 
-        # 将网格线合成到预览图像上
-        preview_surface.blit(grid_surface, (0, 0))
+            with tracer.span("count_frames"):
+                self.frame_count = self.sheet.frame_count(GridSpec(self.rows, self.cols))
 
-        # 缩放预览图像
-        self.scaled_preview = pygame.transform.smoothscale(preview_surface, (scaled_w, scaled_h))
+            # 缩放预览图像
+            with tracer.span("scale"):
+                self.scaled_preview = pygame.transform.smoothscale(preview_surface, (scaled_w, scaled_h))
 
     def get_display_rect(self, screen_width, screen_height):
         """获取图像在窗口中的显示位置（居中显示）"""
@@ -234,85 +207,98 @@ class ManualImageSplitter:
         return window_width, window_height
 
     def save_animation(self):
-        """保存动画文件"""
+        """切帧并把编码提交到保存线程，返回是否有可保存的帧"""
         if self.original_image is None:
             return False
 
-        w, h = self.original_image.size
-        frame_w = w // self.cols
-        frame_h = h // self.rows
-
-        frames = []
-        for y in range(self.rows):
-            for x in range(self.cols):
-                box = (x * frame_w, y * frame_h, (x + 1) * frame_w, (y + 1) * frame_h)
-                frame = self.original_image.crop(box)
-                arr = np.array(frame)
-                if np.all(arr[..., 3] == 0):  # 跳过完全透明帧
-                    continue
-                frames.append(frame)
-
-        if not frames:
+        with tracer.span("split"):
+            frames = self.sheet.split(GridSpec(self.rows, self.cols))
+
+        if not len(frames):
             print(f"⚠️ 跳过 {self.image_files[self.current_index]}（无有效帧）")
             return False
 
-        duration = int(1000 / fps)
         filename = os.path.splitext(self.image_files[self.current_index])[0]
-        outpath = os.path.join(self.output_folder, f"{filename}.{'webp' if format == 'webp' else 'png'}")
-
-        if format == "webp":
-            frames[0].save(
-                outpath,
-                save_all=True,
-                append_images=frames[1:],
-                duration=duration,
-                loop=0,
-                disposal=2,
-                lossless=True
-            )
-        else:
-            frames[0].save(
-                outpath,
-                save_all=True,
-                append_images=frames[1:],
-                duration=duration,
-                loop=0
-            )
-
-        print(f"✅ {filename}: {self.cols}x{self.rows} 网格 → {len(frames)}帧，{fps}fps → {outpath}")
+        outpath = os.path.join(self.output_folder, f"{filename}.{EXTENSIONS[format]}")
+        self.pending_saves.append(self.saver.submit(self.write_animation, frames, outpath, filename,
+                                                    self.rows, self.cols))
         return True
 
-    def run_manual_for_single_image(self, filepath, initial_rows=1, initial_cols=1):
-        """为单个图片运行手动分割界面"""
-        self.image_files = [os.path.basename(filepath)]
+    def write_animation(self, frames, outpath, filename, rows, cols):
+        """在保存线程中编码并写出（帧是序列图上的视图，序列图随帧一起保留到编码结束）"""
+        converter = default_converter(encode_workers)
+        with tracer.span("encode"):
+            frames.save(outpath, format, fps, loop=0, workers=converter.workers, executor=converter.executor)
+        print(f"✅ {filename}: {cols}x{rows} 网格 → {len(frames)}帧，{fps}fps → {outpath}")
+
+    def run_review(self, queue):
+        """在同一个窗口中依次人工确认 queue 中的 (文件名, 自动行数, 自动列数)
+
+        回车保存并进入下一张，ESC 跳过，关闭窗口结束整个会话（剩余的都算跳过）。
+        后面的图片在预取线程中提前解码，保存在后台线程中编码。返回 (已保存, 已跳过) 文件名列表。
+        """
+        self.image_files = [filename for filename, _, _ in queue]
+        self.initial_grids = {filename: (rows, cols) for filename, rows, cols in queue}
         self.current_index = 0
-        self.rows = initial_rows
-        self.cols = initial_cols
-
-        if not self.load_current_image():
-            return False
+        self.prefetch(0)
+        saved, skipped = [], []
 
         pygame.init()
+        self.font = pygame.font.Font(None, 36)
+        self.small_font = pygame.font.Font(None, 24)
 
-        # 计算初始窗口大小
-        window_width, window_height = self.calculate_window_size()
+        while self.current_index < len(self.image_files):
+            filename = self.image_files[self.current_index]
+            initial_rows, initial_cols = self.initial_grids[filename]
+            self.rows, self.cols = max(1, initial_rows), max(1, initial_cols)
+            try:
+                self.load_current_image()
+            except (OSError, ValueError) as e:
+                print(f"❌ 无法打开 {filename}: {e}")
+                skipped.append(filename)
+                self.current_index += 1
+                continue
 
-        # 创建窗口
-        self.screen = pygame.display.set_mode((window_width, window_height), pygame.RESIZABLE)
-        pygame.display.set_caption(
-            f"手动分割 - {self.image_files[self.current_index]} (自动分割结果: {initial_cols}×{initial_rows})")
+            # 按当前图片调整窗口大小
+            window_width, window_height = self.calculate_window_size()
+            self.screen = pygame.display.set_mode((window_width, window_height), pygame.RESIZABLE)
+            pygame.display.set_caption(f"手动分割 {self.current_index + 1}/{len(self.image_files)} - {filename} "
+                                       f"(自动分割结果: {initial_cols}×{initial_rows})")
 
-        self.font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
+            action = self.review_current()
+            if action == "quit":
+                skipped.extend(self.image_files[self.current_index:])
+                break
+            (saved if action == "save" else skipped).append(filename)
+            self.current_index += 1
+
+        pygame.quit()
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+        for future in self.pending_saves:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ 保存失败: {e}")
+        self.pending_saves = []
+        return saved, skipped
+
+    def run_manual_for_single_image(self, filepath, initial_rows=1, initial_cols=1):
+        """为单个图片运行手动分割界面"""
+        saved, _ = self.run_review([(os.path.basename(filepath), initial_rows, initial_cols)])
+        return bool(saved)
 
+    def review_current(self):
+        """当前图片的交互循环，返回 "save"、"skip" 或 "quit" 之一"""
         running = True
-        result = False
+        result = "skip"
 
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
-                    result = False
+                    result = "quit"
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_UP:
                         if self.rows < max_rows:
@@ -333,11 +319,11 @@ class ManualImageSplitter:
                     elif event.key == pygame.K_RETURN:
                         # 保存当前分割
                         if self.save_animation():
-                            result = True
+                            result = "save"
                         running = False
                     elif event.key == pygame.K_ESCAPE:
                         running = False
-                        result = False
+                        result = "skip"
                 elif event.type == pygame.VIDEORESIZE:
                     self.screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
 
@@ -357,7 +343,7 @@ class ManualImageSplitter:
                 "↑/↓: 调整行数",
                 "←/→: 调整列数",
                 "回车: 确认分割",
-                "ESC: 取消"
+                "ESC: 跳过"
             ]
 
             control_text = " | ".join(controls)
@@ -366,7 +352,7 @@ class ManualImageSplitter:
             self.screen.blit(text_surface, text_rect)
 
             # 状态信息
-            status_text = f"手动分割模式 | 分割: {self.cols}×{self.rows} | 缩放: {self.scale_factor:.1%}"
+            status_text = f"手动分割 {self.current_index + 1}/{len(self.image_files)} | 分割: {self.cols}×{self.rows} | 有效帧: {self.frame_count} | 缩放: {self.scale_factor:.1%}"
             status_surface = self.small_font.render(status_text, True, (200, 200, 200))
             status_rect = status_surface.get_rect(center=(screen_width // 2, info_y + 50))
             self.screen.blit(status_surface, status_rect)
@@ -378,34 +364,53 @@ class ManualImageSplitter:
                 size_rect = size_surface.get_rect(center=(screen_width // 2, info_y + 75))
                 self.screen.blit(size_surface, size_rect)
 
+            if latency_hud:
+                tracer.draw_hud(self.screen, self.small_font)
+
             pygame.display.flip()
+            tracer.frame()
 
-        pygame.quit()
         return result
 
 
-def process_all_images():
-    """批量处理所有图片"""
-    image_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.png')]
-    manual_splitter = ManualImageSplitter(input_folder, output_folder)
+def auto_pass(image_files):
+    """第一阶段：在线程池上并行自动分割，返回需要人工确认的 [(文件名, 行数, 列数)]（保持原顺序）
+
+    用线程而不是进程：检测和编码的耗时部分（numpy、zlib、libwebp）都会释放 GIL，
+    各线程共用解码缓存，也不会在子进程中重新导入 pygame。
+    所有线程的帧编码提交到同一个 encode_workers 大小的线程池，总线程数是 auto_workers + encode_workers，
+    而不是每个线程各开一个 CPU 核数的编码池。
+    """
+    failures = {}
+    with Converter(encode_workers) as encoder, ThreadPoolExecutor(max_workers=auto_workers) as pool:
+        futures = {pool.submit(auto_split_and_animate, os.path.join(input_folder, f), encoder): f
+                   for f in image_files}
+        for done, future in enumerate(as_completed(futures), 1):
+            filename = futures[future]
+            try:
+                success, rows, cols = future.result()
+            except Exception as e:
+                print(f"❌ {filename}: {e}")
+                success, rows, cols = False, 1, 1
+            if success:
+                print(f"✅ 自动分割完成 ({done}/{len(image_files)}): {filename}")
+            else:
+                print(f"⚠️ 自动分割结果不理想（{cols}列×{rows}行），加入人工确认队列: {filename}")
+                failures[filename] = (rows, cols)
+    return [(f, *failures[f]) for f in image_files if f in failures]
 
-    for i, filename in enumerate(image_files):
-        filepath = os.path.join(input_folder, filename)
-        print(f"\n处理 {i + 1}/{len(image_files)}: {filename}")
 
-        # 先尝试自动分割
-        success, auto_rows, auto_cols = auto_split_and_animate(filepath)
+def process_all_images():
+    """批量处理所有图片：先并行自动分割，再在一个窗口中依次人工确认失败的图片"""
+    image_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.png')]
+    print(f"第一阶段：自动分割 {len(image_files)} 张图片（{auto_workers} 线程）")
+    queue = auto_pass(image_files)
+    if not queue:
+        return
 
-        # 如果自动分割结果不理想（行或列为1），则启动手动分割
-        if not success or auto_rows == 1 or auto_cols == 1:
-            print(f"⚠️ 自动分割结果不理想（{auto_cols}列×{auto_rows}行），启动手动分割界面: {filename}")
-            manual_success = manual_splitter.run_manual_for_single_image(filepath, auto_rows, auto_cols)
-            if manual_success:
-                print(f"✅ 手动分割完成: {filename}")
-            else:
-                print(f"❌ 手动分割取消: {filename}")
-        else:
-            print(f"✅ 自动分割完成: {filename}")
+    print(f"\n第二阶段：人工确认 {len(queue)} 张图片")
+    saved, skipped = ManualImageSplitter(input_folder, output_folder).run_review(queue)
+    print(f"✅ 手动分割完成 {len(saved)} 张" + (f"，跳过 {len(skipped)} 张: {', '.join(skipped)}" if skipped else ""))
 
 
 # 运行批量处理
@@ -415,4 +420,5 @@ if __name__ == "__main__":
         sys.exit(1)
 
     process_all_images()
+    tracer.close()
     print("🎬 全部处理完成。")
\ No newline at end of file
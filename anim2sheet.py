@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+
+from PIL import Image
+
+from seq2anim import extract_frames, extract_sheet
+
+# ========== 可调参数 ==========
+mode = "sheet"         # "sheet"：还原为序列图；"frames"：输出逐帧 PNG
+cols = None            # 序列图列数（None 为接近正方形）
+compress_level = 6     # PNG 压缩级别 (0-9)
+workers = None         # 并行压缩线程数（None 为 CPU 核数）
+debug = True           # 是否打印调试信息
+# ==============================
+
+ANIMATION_EXTENSIONS = (".webp", ".gif", ".png", ".apng")
+
+
+def is_animation(path):
+    """扫描文件夹时使用：.png 只有含 acTL 的 APNG 才算动画（普通 PNG 多半就是序列图本身）"""
+    if not path.lower().endswith(".png"):
+        return True
+    try:
+        with Image.open(path) as img:  # 只解析到 IDAT 之前的块头
+            return getattr(img, "is_animated", False)
+    except OSError:
+        return False
+
+
+def summarize(durations):
+    """每帧时长的摘要：平均时长和对应的 fps，方便原样重新编码"""
+    if not durations:
+        return "无时长信息"
+    avg = sum(durations) / len(durations)
+    return f"平均 {avg:.0f}ms/帧（≈{1000 / avg:.1f}fps）" if avg else "时长为 0"
+
+
+def extract(path, output, mode="sheet", cols=None, compress_level=6, workers=None):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if mode == "frames":
+        folder = os.path.join(output, name)
+        paths, info = extract_frames(path, folder, name, compress_level, workers)
+        if debug:
+            print(f"✅ {os.path.basename(path)}: {len(paths)}帧 {info.size[0]}x{info.size[1]}，"
+                  f"{summarize(info.durations)} → {folder}")
+        return folder
+    outpath = os.path.join(output, f"{name}.png")
+    if os.path.abspath(outpath) == os.path.abspath(path):
+        outpath = os.path.join(output, f"{name}_sheet.png")
+    grid, info = extract_sheet(path, outpath, cols, compress_level, workers)
+    if debug:
+        print(f"✅ {os.path.basename(path)}: {info.frame_count}帧 → {grid.cols}列 x {grid.rows}行 序列图，"
+              f"每格 {info.size[0]}x{info.size[1]}，{summarize(info.durations)} → {outpath}")
+    return outpath
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把动画 WebP/APNG/GIF 还原为序列图或逐帧 PNG")
+    parser.add_argument("paths", nargs="+", help="动画文件或包含动画的文件夹")
+    parser.add_argument("--frames", action="store_true", default=mode == "frames", help="输出逐帧 PNG 而不是序列图")
+    parser.add_argument("--cols", type=int, default=cols, help="序列图列数（默认接近正方形）")
+    parser.add_argument("--level", type=int, default=compress_level, help="PNG 压缩级别 (0-9)")
+    parser.add_argument("--workers", type=int, default=workers, help="并行压缩线程数")
+    parser.add_argument("--output", default="sheets", help="输出文件夹")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            candidates = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                          if f.lower().endswith(ANIMATION_EXTENSIONS)]
+            files.extend(f for f in candidates if is_animation(f))
+        else:
+            files.append(path)
+
+    os.makedirs(args.output, exist_ok=True)
+    for path in files:
+        try:
+            extract(path, args.output, "frames" if args.frames else "sheet", args.cols, args.level, args.workers)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 跳过 {os.path.basename(path)}（{e}）")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import os
+import struct
+import sys
+from collections import namedtuple
+
+from seq2anim import Sheet, estimate_memory
+from seq2anim.webp import index_chunks
+
+# ========== 可调参数 ==========
+# 单核编码吞吐估计（每秒处理的序列图像素），只用于排序和预估；
+# 在不透明区域较满的 41 帧 280x280 序列图上实测，透明区域多的图会快得多
+encode_pixels_per_second = {"webp": 30e6, "apng": 11e6, "gif": 65e6}
+alpha_threshold = 28                 # 估计序列图帧数时的 alpha 阈值（与 sequence2anim.py 一致）
+max_rows = 20                        # 估计序列图帧数时的最大行数
+max_cols = 20                        # 估计序列图帧数时的最大列数
+# ==============================
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPE_OFFSET = 25  # 签名 8 + 块头 8 + 宽高 8 + 位深 1
+
+# PNG 颜色类型对应的通道数
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+PlanItem = namedtuple("PlanItem", "path kind width height channels has_alpha frames "
+                                  "file_bytes decoded_bytes peak_bytes encode_seconds")
+
+
+def read_png_header(f):
+    """读取 IHDR，并只遍历块头直到 IDAT，以确定是否有 tRNS；不解压任何图像数据"""
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("不是 PNG 文件")
+    length, fourcc = struct.unpack(">I4s", f.read(8))
+    if fourcc != b"IHDR":
+        raise ValueError("PNG 缺少 IHDR")
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", f.read(10))
+    f.seek(length - 10 + 4, os.SEEK_CUR)
+
+    has_trns = False
+    frames = 1
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            break
+        length, fourcc = struct.unpack(">I4s", head)
+        if fourcc == b"tRNS":
+            has_trns = True
+        elif fourcc == b"acTL":
+            frames = struct.unpack(">I", f.read(4))[0]
+            length -= 4
+        elif fourcc in (b"IDAT", b"IEND"):
+            break
+        f.seek(length + 4, os.SEEK_CUR)
+    has_alpha = color_type in (4, 6) or has_trns
+    return width, height, PNG_CHANNELS.get(color_type, 4), bit_depth, has_alpha, frames
+
+
+def read_webp_header(f):
+    """从 RIFF 子块头读取画布尺寸、alpha 标志和 ANMF 帧数"""
+    chunks = index_chunks(f)
+    width = height = 0
+    has_alpha = False
+    frames = 0
+    for fourcc, offset, size in chunks:
+        if fourcc == b"VP8X":
+            f.seek(offset)
+            data = f.read(10)
+            has_alpha = bool(data[0] & 0x10)
+            width = int.from_bytes(data[4:7], "little") + 1
+            height = int.from_bytes(data[7:10], "little") + 1
+        elif fourcc == b"ANMF":
+            frames += 1
+        elif fourcc == b"VP8L" and not width:
+            f.seek(offset + 1)
+            bits = struct.unpack("<I", f.read(4))[0]
+            width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            has_alpha = bool(bits >> 28 & 1)
+        elif fourcc == b"VP8 " and not width:
+            f.seek(offset + 6)
+            w, h = struct.unpack("<HH", f.read(4))
+            width, height = w & 0x3FFF, h & 0x3FFF
+    return width, height, 4 if has_alpha else 3, 8, has_alpha, max(frames, 1)
+
+
+def estimate_sheet_frames(path):
+    """解码序列图，按批量处理同样的边缘检测得到网格，返回非空格子数（需要完整解码）"""
+    sheet = Sheet.open(path, keep_palette=True)
+    sheet.occupancy(alpha_threshold)  # 检测和计数共用同一张积分图
+    grid = sheet.detect_grid(max_rows, max_cols, alpha_threshold)
+    return int((sheet.occupancy(alpha_threshold).cell_counts(grid) > 0).sum())
+
+
+def plan_file(path, keep_palette=False, estimate_frames=False, format="webp"):
+    """只读文件头，估算解码大小、峰值内存、帧数和编码耗时
+
+    keep_palette 为 True 时调色板 PNG 按每像素 1 字节估算（IndexedSheet 不展开成 RGBA）。
+    编码耗时按输出格式的像素吞吐估计：序列图按整张图的像素，动画 WebP 按画布像素 × 帧数，
+    只是上限式的粗略估计，不考虑透明区域裁剪。
+    序列图的帧数要到检测后才知道：estimate_frames 为 True 时解码并检测网格
+    （见 estimate_sheet_frames），否则为 None。
+    """
+    kind = os.path.splitext(path)[1].lower().lstrip(".")
+    indexed = False
+    with open(path, "rb") as f:
+        if kind == "webp":
+            width, height, channels, _, has_alpha, frames = read_webp_header(f)
+        else:
+            width, height, channels, _, has_alpha, frames = read_png_header(f)
+            f.seek(PNG_COLOR_TYPE_OFFSET)
+            indexed = keep_palette and f.read(1) == b"\x03"
+    # 与 ConvertPipeline 的内存预留使用同一估算（seq2anim.estimate_memory）
+    decoded, peak = estimate_memory(width, height, indexed, frames if kind == "webp" else 1)
+    pixels = width * height * (frames if kind == "webp" else 1)
+    if kind != "webp" and frames == 1:
+        frames = estimate_sheet_frames(path) if estimate_frames else None
+    return PlanItem(path, kind, width, height, channels, has_alpha, frames, os.path.getsize(path),
+                    decoded, peak, pixels / encode_pixels_per_second[format])
+
+
+def plan_batch(paths, keep_palette=False, estimate_frames=False, format="webp"):
+    """为一批文件建立计划，按编码耗时从大到小排序（最大的先调度，缩短长尾）"""
+    items = []
+    for path in paths:
+        try:
+            items.append(plan_file(path, keep_palette, estimate_frames, format))
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ 无法读取文件头 {os.path.basename(path)}: {e}")
+    items.sort(key=lambda item: (item.encode_seconds, item.peak_bytes), reverse=True)
+    return items
+
+
+def print_plan(items, workers=1, memory_budget=None):
+    total_decoded = sum(item.decoded_bytes for item in items)
+    total_seconds = sum(item.encode_seconds for item in items)
+    largest = max((item.peak_bytes for item in items), default=0)
+    print(f"共 {len(items)} 个文件，解码后合计 {total_decoded / 2 ** 20:.0f}MB，"
+          f"单个最大峰值 {largest / 2 ** 20:.0f}MB，按像素吞吐估计编码约 {total_seconds:.1f}s（单核）")
+    if memory_budget and largest > memory_budget:
+        print(f"⚠️ 最大文件峰值超过内存预算 {memory_budget / 2 ** 20:.0f}MB，将单独运行")
+    if workers > 1 and items:
+        # 最大的文件决定了并行时的最短总耗时
+        print(f"{workers} 个进程预计耗时 ≥ {max(total_seconds / workers, items[0].encode_seconds):.1f}s")
+    for item in items[:10]:
+        frames = f"{item.frames}帧, " if item.frames is not None else ""
+        print(f"  {os.path.basename(item.path)}: {item.width}x{item.height}, {frames}"
+              f"峰值 {item.peak_bytes / 2 ** 20:.0f}MB, ~{item.encode_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[2:] and sys.argv[2] not in encode_pixels_per_second:
+        print("用法: python batch_plan.py <输入文件夹> [webp|apng|gif]")
+        sys.exit(1)
+    folder = sys.argv[1]
+    print_plan(plan_batch([os.path.join(folder, f) for f in os.listdir(folder)
+                           if f.lower().endswith((".png", ".webp"))], estimate_frames=True,
+                          format=sys.argv[2] if len(sys.argv) == 3 else "webp"))
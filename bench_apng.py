@@ -0,0 +1,66 @@
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+from seq2anim import encode_apng_animation
+
+# 对比 Pillow 顺序保存 APNG 与 seq2anim 并行写入的耗时
+# 用法: python bench_apng.py <序列图.png> <行数> <列数>
+#
+# 依次用 1、2、4…直到 CPU 核数个线程编码，打印每档的耗时和相对 Pillow 的加速比；
+# 另外统计单线程时可并行部分（逐帧过滤 + zlib）占总 CPU 时间的比例，按 Amdahl 定律给出 N 核的理论上限。
+# 实测（1 核机器，SequenceMap 3 (6).png 按 6x7 切成 42帧 280x280）：Pillow 0.26s，并行写入 0.27s，
+# 可并行部分约占 97%，理论上限 2 核 ≈1.9x、4 核 ≈3.6x、8 核 ≈6.4x；多核的实测数字需要在多核机器上运行本脚本得到。
+
+
+def benchmark(frames, duration=83, workers=None):
+    """返回 (Pillow 秒, 并行秒)"""
+    start = time.perf_counter()
+    frames[0].save(io.BytesIO(), "PNG", save_all=True, append_images=frames[1:],
+                   duration=duration, loop=0)
+    pillow_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_apng_animation(frames, duration, workers=workers)
+    parallel_time = time.perf_counter() - start
+    return pillow_time, parallel_time
+
+
+def parallel_fraction(frames, duration=83):
+    """单线程编码时，调用线程自身（读帧、裁剪、拼装数据块）以外的 CPU 时间占总 CPU 时间的比例"""
+    start_cpu, start_main = time.process_time(), time.thread_time()
+    encode_apng_animation(frames, duration, workers=1)
+    total, serial = time.process_time() - start_cpu, time.thread_time() - start_main
+    return 1 - serial / total
+
+
+def worker_counts(cores):
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("用法: python bench_apng.py <序列图.png> <行数> <列数>")
+        sys.exit(1)
+    sheet = Image.open(sys.argv[1]).convert("RGBA")
+    rows, cols = int(sys.argv[2]), int(sys.argv[3])
+    frame_w, frame_h = sheet.width // cols, sheet.height // rows
+    cells = [sheet.crop((x * frame_w, y * frame_h, (x + 1) * frame_w, (y + 1) * frame_h))
+             for y in range(rows) for x in range(cols)]
+    cores = os.cpu_count() or 1
+    print(f"{len(cells)}帧 {frame_w}x{frame_h}，{cores}核")
+    for workers in worker_counts(cores):
+        pillow_time, parallel_time = benchmark(cells, workers=workers)
+        print(f"  {workers}线程: Pillow {pillow_time:.2f}s, 并行 {parallel_time:.2f}s, "
+              f"加速 {pillow_time / parallel_time:.2f}x")
+    p = parallel_fraction(cells)
+    bounds = ", ".join(f"{n}核 ≈{1 / ((1 - p) + p / n):.1f}x" for n in (2, 4, 8, 16))
+    print(f"可并行部分 {p:.0%}，相对单线程的理论上限: {bounds}")
@@ -0,0 +1,23 @@
+"""序列图 → 动画的共享实现：读图、网格检测、切帧、透明像素清理和 WebP/APNG/GIF 编码
+
+各脚本（sequence2anim.py、aac.py、viewcut.py、spritesheet_tool.py）都只是这里的薄封装。
+所有函数既接受磁盘路径，也接受字节串、文件对象和 numpy 数组，编码结果以字节串返回。
+"""
+from .apng import encode_apng_animation, save_apng_animation
+from .archive import ArchiveWriter, load_index, read_member
+from .budget import EncodeSettings, TuneResult, describe, fit_to_budget
+from .cache import SheetCache, default_cache_folder
+from .cleanup import clean_transparent_pixels
+from .convert import ConvertResult, Converter, convert, default_converter
+from .extract import AnimationInfo, PngBandWriter, extract_frames, extract_sheet, iter_animation
+from .folder import FolderResult, encode_folder, list_frames, natural_key, read_frames
+from .frames import EXTENSIONS, FORMATS, FrameSet, encode_frames, frame_duration
+from .gif import encode_gif_animation, save_gif_animation
+from .grid import GridConfidence, GridSpec, detect_grid, detect_max_cols, detect_max_rows, grid_confidence, predict_layout
+from .palette import image_palette, palette_image
+from .pipeline import ConvertPipeline, PipelineResult, StageStats, format_stats
+from .sheet import PEAK_FACTOR, IndexedSheet, Sheet, estimate_memory
+from .tiles import TilePyramid
+from .trace import Tracer
+from .util import write_bytes
+from .webp import encode_webp_animation, save_webp_animation
@@ -0,0 +1,165 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import chain, repeat
+
+import numpy as np
+
+from .util import bounded, write_bytes
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# fcTL 的 dispose_op / blend_op
+APNG_DISPOSE_BACKGROUND = 1
+APNG_BLEND_SOURCE = 0
+
+
+def _chunk(fourcc, payload):
+    """拼装 PNG 数据块（长度 + 类型 + 数据 + CRC）"""
+    crc = zlib.crc32(payload, zlib.crc32(fourcc)) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + fourcc + payload + struct.pack(">I", crc)
+
+
+def filter_rows(arr):
+    """对 (h, w, c) 的 uint8 数组做 PNG 行过滤，返回带过滤类型字节的扫描线
+
+    过滤只依赖原始像素（左、上、左上），因此五种过滤可以整图向量化计算，
+    再按 libpng 的启发式（有符号绝对值之和最小）逐行挑选。
+    """
+    h, w, bpp = arr.shape
+    raw = arr.reshape(h, w * bpp)
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    up_left = np.zeros_like(raw)
+    up_left[1:, bpp:] = raw[:-1, :-bpp]
+
+    a = left.astype(np.int16)
+    b = up.astype(np.int16)
+    c = up_left.astype(np.int16)
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+    average = ((a + b) >> 1).astype(np.uint8)
+
+    candidates = np.stack([raw, raw - left, raw - up, raw - average, raw - paeth])
+    scores = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+    best = scores.argmin(axis=0)
+
+    out = np.empty((h, w * bpp + 1), dtype=np.uint8)
+    out[:, 0] = best
+    out[:, 1:] = candidates[best, np.arange(h)]
+    return out
+
+
+def _compress_frame(arr, level):
+    return zlib.compress(filter_rows(arr).tobytes(), level)
+
+
+def _alpha_box(arr, alpha_lut=None):
+    """非透明区域的包围盒 (left, top, right, bottom)，全透明时返回整帧
+
+    调色板下标帧传入 alpha_lut（下标 → 是否可见的查找表）。
+    """
+    h, w = arr.shape[:2]
+    alpha = arr[..., 3] if alpha_lut is None else alpha_lut[arr]
+    ys = np.flatnonzero(alpha.any(axis=1))
+    if not ys.size:
+        return 0, 0, w, h
+    xs = np.flatnonzero(alpha.any(axis=0))
+    return int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1
+
+
+def _as_array(frame):
+    """帧可以是 PIL 图像或 (h, w, 4) 的 uint8 数组"""
+    if isinstance(frame, np.ndarray):
+        return frame
+    return np.asarray(frame.convert("RGBA") if frame.mode != "RGBA" else frame)
+
+
+def _palette_chunks(palette):
+    """索引色 PNG 的 PLTE 和 tRNS（末尾不透明的条目不写入 tRNS）"""
+    palette = np.asarray(palette, dtype=np.uint8)[:256]
+    chunks = [_chunk(b"PLTE", palette[:, :3].tobytes())]
+    alpha = palette[:, 3]
+    translucent = np.flatnonzero(alpha != 255)
+    if translucent.size:
+        chunks.append(_chunk(b"tRNS", alpha[:translucent[-1] + 1].tobytes()))
+    return chunks
+
+
+def encode_apng_animation(frames, duration, loop=0, compress_level=6, workers=None, executor=None, palette=None):
+    """在线程池上并行过滤并压缩每一帧，按顺序输出 acTL/fcTL/IDAT/fdAT，返回字节串
+
+    zlib 压缩时会释放 GIL，所以线程池即可占满多核。除首帧外，每帧都裁剪到
+    非透明区域，并使用“覆盖 + 显示后清除为背景”，与整帧输出的显示效果一致。
+    frames 可以是生成器：同时在途的帧数不超过 workers 的两倍，acTL 的帧数在最后补上。
+    传入 palette（(n, 4) 的 RGBA 调色板）时帧是 (h, w) 的下标数组，输出 8 位索引色 APNG；
+    Pillow 等解码器把“清除为背景”实现为填充下标 0，所以只有下标 0 完全透明时才裁剪，否则输出整帧。
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("没有可编码的帧")
+    durations = repeat(duration) if isinstance(duration, int) else iter(duration)
+    as_array = _as_array if palette is None else np.asarray
+    height, width = as_array(first).shape[:2]
+    workers = workers or os.cpu_count() or 1
+    alpha_lut = None
+    crop_frames = True
+
+    out = [PNG_SIGNATURE,
+           _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6 if palette is None else 3, 0, 0, 0)),
+           None]  # acTL，编码完才知道帧数
+    if palette is not None:
+        out.extend(_palette_chunks(palette))
+        alpha_lut = np.zeros(256, dtype=bool)
+        alpha_lut[:len(palette)] = np.asarray(palette)[:256, 3] > 0
+        crop_frames = not alpha_lut[0]
+    count = 0
+    seq = 0
+
+    def flush(item):
+        nonlocal seq
+        index, box, delay, future = item
+        left, top, right, bottom = box
+        out.append(_chunk(b"fcTL", struct.pack(">IIIIIHHBB", seq, right - left, bottom - top, left, top,
+                                               delay, 1000, APNG_DISPOSE_BACKGROUND, APNG_BLEND_SOURCE)))
+        seq += 1
+        data = future.result()
+        if index == 0:
+            out.append(_chunk(b"IDAT", data))
+        else:
+            out.append(_chunk(b"fdAT", struct.pack(">I", seq) + data))
+            seq += 1
+
+    def submit_all(pool):
+        nonlocal count
+        for index, frame in enumerate(chain([first], frames)):
+            arr = as_array(frame)
+            count += 1
+            # 首帧同时作为默认图像，必须覆盖整个画布
+            box = (0, 0, width, height) if index == 0 or not crop_frames else _alpha_box(arr, alpha_lut)
+            left, top, right, bottom = box
+            crop = arr[top:bottom, left:right]
+            future = pool.submit(_compress_frame, crop if palette is None else crop[..., None], compress_level)
+            yield index, box, min(int(next(durations)), 0xFFFF), future
+
+    with (nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=workers)) as pool:
+        for item in bounded(submit_all(pool), workers * 2):
+            flush(item)
+
+    out[2] = _chunk(b"acTL", struct.pack(">II", count, loop))
+    out.append(_chunk(b"IEND", b""))
+    return b"".join(out)
+
+
+def save_apng_animation(frames, outpath, duration, loop=0, compress_level=6, workers=None, executor=None,
+                        palette=None):
+    """并行编码 APNG 并写入文件（路径或文件对象）"""
+    data = encode_apng_animation(frames, duration, loop, compress_level, workers, executor, palette)
+    return write_bytes(outpath, data)
+
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+
+INDEX_SUFFIX = ".index.json"
+
+
+def archive_kind(path):
+    """按扩展名判断归档格式：.zip 或 .tar"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in (".zip", ".tar"):
+        raise ValueError(f"只支持 .zip 或 .tar 归档: {path}")
+    return ext[1:]
+
+
+class ArchiveWriter:
+    """把编码好的动画依次追加到一个 zip / tar 里，代替成千上万个小文件
+
+    条目不压缩（动画本身已经压缩过），写入同目录的临时文件，close 时原子替换为最终文件，
+    并在旁边写出索引 <归档>.index.json：每个条目数据在归档中的 (偏移, 长度)，
+    读取单个动画时直接 seek（见 read_member），不需要解析归档。
+    中途出错（with 块抛出异常）时删除临时文件，已有的同名归档保持不变。
+    """
+
+    def __init__(self, path, kind=None):
+        self.path = path
+        self.kind = kind or archive_kind(path)
+        self.entries = {}
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.f = open(self.tmp, "wb")
+        if self.kind == "zip":
+            self.archive = zipfile.ZipFile(self.f, "w", zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self.archive = tarfile.open(fileobj=self.f, mode="w", format=tarfile.PAX_FORMAT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name, data):
+        """追加一个条目，返回数据在归档中的偏移"""
+        if name in self.entries:
+            raise ValueError(f"归档中已有同名条目: {name}")
+        if self.kind == "zip":
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self.archive.writestr(info, data)
+            # 不压缩且可 seek 时 zipfile 回写本地文件头，数据紧挨在文件尾之前
+            offset = self.f.tell() - len(data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.archive.addfile(info, io.BytesIO(data))
+            # tar 数据按 512 字节块补齐
+            blocks, remainder = divmod(len(data), tarfile.BLOCKSIZE)
+            offset = self.archive.offset - (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+        self.entries[name] = (offset, len(data))
+        return offset
+
+    def close(self):
+        """写完归档尾部，原子替换最终文件，再写索引"""
+        self.archive.close()
+        self.f.close()
+        index = {"format": self.kind, "bytes": os.path.getsize(self.tmp), "entries": self.entries}
+        os.replace(self.tmp, self.path)
+        index_tmp = f"{self.path}{INDEX_SUFFIX}.{os.getpid()}.tmp"
+        with open(index_tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(index_tmp, self.path + INDEX_SUFFIX)
+
+    def abort(self):
+        try:
+            self.archive.close()
+        except Exception:
+            pass
+        self.f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+
+
+def load_index(path):
+    """读取归档旁的索引，归档大小与索引不一致（归档被替换过）时抛出 ValueError"""
+    with open(path + INDEX_SUFFIX, encoding="utf-8") as f:
+        index = json.load(f)
+    if os.path.getsize(path) != index["bytes"]:
+        raise ValueError(f"索引与归档不一致: {path}")
+    return index
+
+
+def read_member(path, name, index=None):
+    """按索引直接读出归档中的一个动画"""
+    index = index or load_index(path)
+    offset, size = index["entries"][name]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
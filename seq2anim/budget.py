@@ -0,0 +1,113 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .frames import encode_frames
+
+EncodeSettings = namedtuple("EncodeSettings", "format lossless quality scale fps")
+TuneResult = namedtuple("TuneResult", "data settings frame_count encodes fits")
+
+# 无损和有损都超出预算时依次尝试的 (缩放比例, 抽帧间隔)；抽帧间隔为 2 即隔一帧取一帧、fps 减半
+DEFAULT_STEPS = ((0.75, 1), (0.5, 1), (0.5, 2))
+
+
+def describe(settings):
+    """设置的简短说明，用于日志"""
+    parts = [settings.format, "无损" if settings.lossless else f"有损 q={settings.quality}"]
+    if settings.scale != 1:
+        parts.append(f"缩放 {settings.scale:g}")
+    parts.append(f"{settings.fps:g}fps")
+    return "，".join(parts)
+
+
+def scale_frames(frames, scale, palette=None):
+    """按比例缩放每一帧；调色板下标帧用最近邻（不产生新颜色），RGBA 帧用 Lanczos"""
+    if scale == 1:
+        return list(frames)
+    h, w = frames[0].shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    mode, resample = ("P", Image.NEAREST) if palette is not None else ("RGBA", Image.LANCZOS)
+    return [np.asarray(Image.fromarray(np.ascontiguousarray(f), mode).resize(size, resample)) for f in frames]
+
+
+def _spread(low, high, count):
+    """(low, high) 开区间内均匀分布的至多 count 个整数质量"""
+    points = {low + round((high - low) * (i + 1) / (count + 1)) for i in range(count)}
+    return sorted(q for q in points if low < q < high)
+
+
+def fit_to_budget(frames, max_bytes, format="webp", fps=12, loop=0, workers=None, executor=None, palette=None,
+                  min_quality=10, quality_step=5, steps=DEFAULT_STEPS, parallel=3):
+    """在字节预算内找画质最高的编码设置，返回 TuneResult(data, settings, frame_count, encodes, fits)
+
+    依次尝试原尺寸和 steps 中的每一档（缩放、抽帧）；每一档先编码一次无损，
+    超出预算时（只有 webp 有质量参数）在 [min_quality, 100] 上做 parallel 路并行的区间搜索：
+    每轮同时编码区间内均匀分布的 parallel 个质量，把区间缩小到约 1/(parallel+1)，
+    直到相邻的“合格 / 超出”质量相差不超过 quality_step。第一轮总是包含 min_quality，
+    最低质量也超出时立即进入下一档。所有设置都超出预算时返回最小的结果，fits 为 False。
+    frames 可以是 FrameSet（使用它的调色板）或帧数组列表。
+    """
+    palette = getattr(frames, "palette", palette)
+    frames = list(frames)
+    if not frames:
+        raise ValueError("没有可编码的帧")
+    workers = workers or os.cpu_count() or 1
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=workers)
+    encodes = 0
+    smallest = None
+
+    def run(candidates, batch):
+        """并行编码一批 (帧, 设置)，返回字节串列表"""
+        nonlocal encodes, smallest
+        futures = [candidates.submit(encode_frames, f, s.format, s.fps, loop, workers, executor, palette,
+                                     None if s.lossless else s.quality) for f, s in batch]
+        results = []
+        for (f, settings), future in zip(batch, futures):
+            data = future.result()
+            encodes += 1
+            if smallest is None or len(data) < len(smallest[0]):
+                smallest = (data, settings, len(f))
+            results.append(data)
+        return results
+
+    try:
+        # 候选编码各自占一个线程，逐帧编码共用 executor，不会互相等待
+        with ThreadPoolExecutor(max_workers=parallel) as candidates:
+            for scale, step in ((1, 1),) + tuple(steps):
+                stepped = scale_frames(frames[::step], scale, palette)
+                step_fps = fps / step
+                lossless = EncodeSettings(format, True, None, scale, step_fps)
+                data, = run(candidates, [(stepped, lossless)])
+                if len(data) <= max_bytes:
+                    return TuneResult(data, lossless, len(stepped), encodes, True)
+                if format != "webp":
+                    continue
+
+                best = None      # (质量, 字节串)：预算内质量最高的结果
+                high = 101       # 已知超出预算的最低质量（无损视为 101）
+                qualities = [min_quality] + _spread(min_quality, high, parallel - 1)
+                while qualities:
+                    batch = [(stepped, EncodeSettings(format, False, q, scale, step_fps)) for q in qualities]
+                    over = []
+                    for q, data in zip(qualities, run(candidates, batch)):
+                        if len(data) > max_bytes:
+                            over.append(q)
+                        elif best is None or q > best[0]:
+                            best = (q, data)
+                    if best is None:
+                        break
+                    # 体积随质量大致单调；低于已合格质量的“超出”忽略
+                    high = min([q for q in over if q > best[0]] + [high])
+                    qualities = _spread(best[0], high, parallel) if high - best[0] > quality_step else []
+                if best is not None:
+                    settings = EncodeSettings(format, False, best[0], scale, step_fps)
+                    return TuneResult(best[1], settings, len(stepped), encodes, True)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    data, settings, frame_count = smallest
+    return TuneResult(data, settings, frame_count, encodes, False)
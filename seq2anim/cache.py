@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+HASH_BLOCK = 1 << 20
+EVICT_TO = 0.8  # 超过上限时淘汰到上限的 80%，留出余量，缓存写满后不必每次写入都扫描目录
+
+
+def default_cache_folder():
+    """SEQ2ANIM_CACHE 环境变量，否则为用户缓存目录下的 seq2anim/sheets"""
+    folder = os.environ.get("SEQ2ANIM_CACHE")
+    if folder:
+        return folder
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "seq2anim", "sheets")
+
+
+def file_digest(path):
+    """文件内容的 blake2b 摘要（按 1MB 分块读取）"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SheetCache:
+    """解码后 RGBA 序列图的磁盘缓存
+
+    每张图保存为一个 .npy 文件（原始像素 + 形状头），命中时用只读 mmap 打开，
+    检测、切帧和预览都直接读映射的页面，不再解码 PNG，也不复制像素。
+    键为文件内容摘要 + mtime；总大小超过 max_bytes 时按最近使用时间淘汰。
+    总大小只在第一次写入时扫描目录得到，之后在内存中累加，超过上限时才重新扫描并淘汰。
+    多个进程可以共用同一个目录：写入先写临时文件再原子重命名（其他进程写入的条目在下一次扫描时计入）。
+    """
+
+    def __init__(self, folder=None, max_bytes=8 * 2 ** 30):
+        self.folder = folder or default_cache_folder()
+        self.max_bytes = max_bytes
+        # (路径, 大小, mtime) → 键；同一会话内重复打开同一文件时不必重新计算摘要
+        self._keys = {}
+        self._total = None  # 目录中条目的总大小（估计值），None 为尚未扫描
+        self._lock = threading.Lock()
+
+    def key(self, path):
+        st = os.stat(path)
+        stat_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        key = self._keys.get(stat_key)
+        if key is None:
+            key = self._keys[stat_key] = f"{file_digest(path)}-{st.st_mtime_ns}"
+        return key
+
+    def _entry(self, key):
+        return os.path.join(self.folder, f"{key}.npy")
+
+    def get(self, path):
+        """命中时返回只读 mmap 数组，否则返回 None"""
+        entry = self._entry(self.key(path))
+        try:
+            array = np.load(entry, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(entry)  # 记录最近使用时间，供 LRU 淘汰
+        except OSError:
+            pass
+        return array
+
+    def put(self, path, array):
+        """写入缓存并返回映射后的数组；写入失败（磁盘满、只读目录等）时返回原数组"""
+        if array.nbytes > self.max_bytes:
+            return array
+        entry = self._entry(self.key(path))
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp, entry)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return array
+        if self._added(os.path.getsize(entry)) > self.max_bytes:
+            self.evict(keep=entry)
+        try:
+            return np.load(entry, mmap_mode="r")
+        except (OSError, ValueError):
+            return array
+
+    def load(self, path):
+        """返回文件解码后的 (h, w, 4) RGBA 数组，优先使用缓存"""
+        array = self.get(path)
+        if array is not None:
+            return array
+        with Image.open(path) as img:
+            array = np.array(img.convert("RGBA"))
+        return self.put(path, array)
+
+    def entries(self):
+        """[(路径, 大小, 最近使用时间)]，按最近使用时间从旧到新排序"""
+        items = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return items
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            entry = os.path.join(self.folder, name)
+            try:
+                st = os.stat(entry)
+            except OSError:
+                continue
+            items.append((entry, st.st_size, st.st_mtime))
+        items.sort(key=lambda item: item[2])
+        return items
+
+    def _added(self, size):
+        """记录新写入的条目，返回当前总大小；第一次调用时扫描目录（扫描结果已包含新条目）"""
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self.entries())
+            else:
+                self._total += size
+            return self._total
+
+    def evict(self, keep=None):
+        """扫描目录，总大小超过 max_bytes 时删除最久未使用的条目，直到不超过 max_bytes * EVICT_TO；
+        返回删除的条目数
+
+        keep 为刚写入的条目，不会被删除：它本身超过 max_bytes * EVICT_TO 时只删到其他条目都删完为止，
+        否则一个接近上限的大图每次写入后都会立刻被淘汰，永远不能命中。
+        """
+        with self._lock:
+            items = self.entries()
+            total = sum(size for _, size, _ in items)
+            target = self.max_bytes * EVICT_TO if total > self.max_bytes else self.max_bytes
+            removed = 0
+            for entry, size, _ in items:
+                if total <= target:
+                    break
+                if entry == keep:
+                    continue
+                try:
+                    os.remove(entry)
+                except OSError:
+                    continue  # 其他进程正在使用（Windows 上无法删除已映射的文件）
+                total -= size
+                removed += 1
+            self._total = total
+            return removed
+
+    def clear(self):
+        for entry, _, _ in self.entries():
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+        self._total = None
@@ -0,0 +1,31 @@
+import numpy as np
+
+BAND_ROWS = 256  # 按行带处理，控制临时数组的内存
+
+
+def clean_transparent_pixels(arr, alpha_threshold, mode="zero"):
+    """原地清理 (h, w, 4) 的 RGBA 数组，返回被修改的像素数
+
+    alpha 低于 alpha_threshold 的像素被置为完全透明；完全透明像素的 RGB
+    在 "zero" 模式下清零，在 "bleed" 模式下用同一行左侧最近的可见颜色填充
+    （无损编码器对这两种都压缩得很好）。alpha >= alpha_threshold 的像素保持不变。
+    """
+    h, w = arr.shape[:2]
+    changed = 0
+    cols = np.arange(w, dtype=np.int32)
+    for top in range(0, h, BAND_ROWS):
+        band = arr[top:top + BAND_ROWS]
+        alpha = band[..., 3]
+        transparent = alpha < alpha_threshold
+        if not transparent.any():
+            continue
+        before = band[transparent]
+        band[transparent] = 0
+        changed += int(np.count_nonzero(before.any(axis=1)))
+        if mode == "bleed":
+            # 每行记录左侧最近的可见像素下标，再整体取值（前导透明像素取到的是已清零的第 0 列）
+            source = np.maximum.accumulate(np.where(transparent, 0, cols), axis=1)
+            rows = np.arange(band.shape[0])[:, None]
+            band[..., :3] = band[rows, source, :3]
+    return changed
+
@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .budget import fit_to_budget
+from .grid import GridSpec, detect_max_cols, detect_max_rows, predict_layout
+from .sheet import Sheet
+
+ConvertResult = namedtuple("ConvertResult", "data grid frame_count size settings", defaults=(None,))
+
+
+class Converter:
+    """可复用的转换器：编码线程池和检测用的掩码缓冲区在多次调用之间复用
+
+    同一个 Converter 不要在多个线程中同时调用 convert（掩码缓冲区是共享的）。
+    """
+
+    def __init__(self, workers=None, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._mask = np.empty(0, dtype=bool)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def _mask_buffer(self, shape):
+        size = shape[0] * shape[1]
+        if self._mask.size < size:
+            self._mask = np.empty(size, dtype=bool)
+        return self._mask[:size].reshape(shape)
+
+    def detect(self, sheet, max_rows=20, max_cols=20, alpha_threshold=28, rows=None, cols=None,
+               method="edges", debug=False):
+        """检测网格；rows / cols 给定时直接使用，只检测缺少的那一个"""
+        if rows and cols:
+            return GridSpec(rows, cols)
+        if method == "projection":
+            detected = predict_layout(sheet.alpha)
+            return GridSpec(rows or detected.rows, cols or detected.cols)
+        # 图片已有同一阈值的积分图（界面或打分建过）时直接使用，否则一次掩码扫描更快
+        opaque = sheet.occupancy(alpha_threshold, build=False)
+        if opaque is None:
+            opaque = sheet.opaque(alpha_threshold, self._mask_buffer(sheet.array.shape[:2]))
+        rows = rows or detect_max_rows(opaque, max_rows, debug)
+        cols = cols or detect_max_cols(opaque, max_cols, rows, debug)
+        return GridSpec(rows, cols)
+
+    def convert(self, source, format="webp", fps=12, alpha_threshold=28, max_rows=20, max_cols=20,
+                rows=None, cols=None, cleanup=None, method="edges", loop=0, debug=False, keep_palette=False,
+                max_bytes=None):
+        """序列图（路径 / 字节串 / 文件对象 / 数组）→ 动画字节串
+
+        keep_palette 为 True 时调色板图片全程保持索引色（见 IndexedSheet）。
+        传入 max_bytes 时自动搜索预算内画质最高的设置（见 budget.fit_to_budget），
+        选中的 EncodeSettings 放在结果的 settings 中。
+        """
+        sheet = Sheet.open(source, cache=self.cache, keep_palette=keep_palette)
+        if cleanup:
+            sheet.cleanup(alpha_threshold, cleanup)
+        grid = self.detect(sheet, max_rows, max_cols, alpha_threshold, rows, cols, method, debug)
+        frames = sheet.split(grid)
+        if not len(frames):
+            return ConvertResult(None, grid, 0, sheet.size)
+        if max_bytes:
+            tuned = fit_to_budget(frames, max_bytes, format, fps, loop, self.workers, self.executor)
+            return ConvertResult(tuned.data, grid, tuned.frame_count, sheet.size, tuned.settings)
+        data = frames.encode(format, fps, loop, workers=self.workers, executor=self.executor)
+        return ConvertResult(data, grid, len(frames), sheet.size)
+
+
+_local = threading.local()
+
+
+def default_converter(workers=None):
+    """每个线程一个默认转换器，线程池和缓冲区在该线程的调用之间复用（workers 只在首次创建时生效）"""
+    converter = getattr(_local, "converter", None)
+    if converter is None:
+        converter = _local.converter = Converter(workers)
+    return converter
+
+
+def convert(source, **kwargs):
+    """使用默认转换器转换一张序列图，参数见 Converter.convert"""
+    return default_converter().convert(source, **kwargs)
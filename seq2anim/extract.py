@@ -0,0 +1,159 @@
+import math
+import os
+import struct
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .apng import PNG_SIGNATURE, _chunk, filter_rows
+from .grid import GridSpec
+from .util import bounded, drain
+
+AnimationInfo = namedtuple("AnimationInfo", "frame_count size durations")
+
+ZLIB_HEADER = b"\x78\x9c"
+DEFLATE_FINAL_EMPTY = b"\x03\x00"  # 空的最终压缩块，结束逐段拼接的 deflate 流
+BAND_ROWS = 64  # 每个压缩任务的行数
+
+
+def animation_info(source):
+    """只读容器信息：帧数和画布尺寸；durations 为空列表，由 iter_animation 逐帧填入（毫秒）"""
+    with Image.open(source) as img:
+        return AnimationInfo(getattr(img, "n_frames", 1), img.size, [])
+
+
+def iter_animation(source, durations=None):
+    """逐帧产出合成后的整帧 RGBA 数组
+
+    帧的混合（blend）和显示后处理（dispose）由 Pillow 的 WebP/APNG 解码器完成，
+    每帧都是完整画面；一次只保留当前帧。传入列表 durations 时追加每帧时长。
+    """
+    with Image.open(source) as img:
+        for i in range(getattr(img, "n_frames", 1)):
+            img.seek(i)
+            frame = np.array(img.convert("RGBA"))
+            if durations is not None:
+                durations.append(int(img.info.get("duration", 0)))
+            yield frame
+
+
+def _compress_band(band, prev_row, level):
+    """过滤并压缩一段扫描线；上一段的最后一行作为 up / paeth 过滤的参考行"""
+    if prev_row is not None:
+        filtered = filter_rows(np.concatenate([prev_row[None], band]))[1:]
+    else:
+        filtered = filter_rows(band)
+    data = filtered.tobytes()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    # SYNC_FLUSH 让每段在字节边界结束，各段可以独立压缩后直接拼接
+    return data, compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class PngBandWriter:
+    """按行带写出 RGBA PNG：各行带在线程池上并行过滤压缩，按顺序写入 IDAT
+
+    同时在途的行带不超过 workers 的两倍，内存与图片高度无关。
+    各段是独立的 deflate 块（pigz 的做法），压缩率比整图单流略低。
+    """
+
+    def __init__(self, f, width, height, compress_level=6, workers=None):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.compress_level = compress_level
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.adler = 1
+        self.rows = 0
+        self.prev_row = None
+        f.write(PNG_SIGNATURE)
+        f.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        f.write(_chunk(b"IDAT", ZLIB_HEADER))
+
+    def write(self, band):
+        """写入 (n, width, 4) 的下一段扫描线（写入后调用方不应再修改 band）"""
+        if band.shape[1] != self.width or self.rows + band.shape[0] > self.height:
+            raise ValueError(f"行带尺寸不符: {band.shape}")
+        for top in range(0, band.shape[0], BAND_ROWS):
+            part = band[top:top + BAND_ROWS]
+            self.pending.append(self.pool.submit(_compress_band, part, self.prev_row, self.compress_level))
+            self.prev_row = part[-1]
+            self.rows += part.shape[0]
+            for future in drain(self.pending, self.workers * 2):
+                self._flush(future)
+
+    def _flush(self, future):
+        data, compressed = future.result()
+        self.adler = zlib.adler32(data, self.adler)
+        self.f.write(_chunk(b"IDAT", compressed))
+
+    def close(self):
+        for future in drain(self.pending):
+            self._flush(future)
+        self.pool.shutdown()
+        if self.rows != self.height:
+            raise ValueError(f"只写入了 {self.rows}/{self.height} 行")
+        self.f.write(_chunk(b"IDAT", DEFLATE_FINAL_EMPTY + struct.pack(">I", self.adler & 0xFFFFFFFF)))
+        self.f.write(_chunk(b"IEND", b""))
+
+
+def sheet_grid(frame_count, cols=None):
+    """帧数对应的网格：默认接近正方形（列数为 ceil(sqrt(n))）"""
+    cols = cols or max(1, math.ceil(math.sqrt(frame_count)))
+    return GridSpec(max(1, math.ceil(frame_count / cols)), cols)
+
+
+def extract_sheet(source, outpath, cols=None, compress_level=6, workers=None):
+    """把动画按行优先排成序列图 PNG，每格就是原画布大小，与各切分工具的网格一致
+
+    PNG 按扫描线写出，一行扫描线横跨整行格子，所以要凑满一行帧才能写出一个行带：
+    内存约为一整行帧（cols 帧，默认约 sqrt(帧数) 帧）加上至多 workers 的两倍个在途的压缩行带，
+    与帧数的平方根成正比，而不是与总帧数成正比。返回 (GridSpec, AnimationInfo)。
+    """
+    info = animation_info(source)
+    grid = sheet_grid(info.frame_count, cols)
+    w, h = info.size
+    band = np.zeros((h, w * grid.cols, 4), dtype=np.uint8)
+    with open(outpath, "wb") as f:
+        writer = PngBandWriter(f, w * grid.cols, h * grid.rows, compress_level, workers)
+        col = 0
+        for frame in iter_animation(source, info.durations):
+            band[:, col * w:(col + 1) * w] = frame
+            col += 1
+            if col == grid.cols:
+                writer.write(band)
+                band = np.zeros_like(band)
+                col = 0
+        if col:
+            writer.write(band)
+        # 帧数不足以填满的行保持透明
+        for _ in range(grid.rows - writer.rows // h):
+            writer.write(np.zeros_like(band))
+        writer.close()
+    return grid, info
+
+
+def extract_frames(source, folder, prefix=None, compress_level=6, workers=None):
+    """把动画的每一帧写成单独的 PNG（prefix_0001.png ...），在线程池上并行编码
+
+    同时在途的帧数不超过 workers 的两倍。返回 (写入的路径列表, AnimationInfo)。
+    """
+    prefix = prefix or os.path.splitext(os.path.basename(str(source)))[0]
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(folder, exist_ok=True)
+    info = animation_info(source)
+    digits = max(4, len(str(info.frame_count)))
+
+    def save(arr, path):
+        Image.fromarray(arr, "RGBA").save(path, compress_level=compress_level)
+        return path
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        submitted = (pool.submit(save, frame, os.path.join(folder, f"{prefix}_{i + 1:0{digits}d}.png"))
+                     for i, frame in enumerate(iter_animation(source, info.durations)))
+        paths = [future.result() for future in bounded(submitted, workers * 2)]
+    return paths, info
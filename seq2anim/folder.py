@@ -0,0 +1,79 @@
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .frames import encode_frames
+from .util import bounded
+
+FRAME_EXTENSIONS = (".png", ".webp")
+
+FolderResult = namedtuple("FolderResult", "data frame_count canvas seconds")
+
+
+def natural_key(name):
+    """自然排序键：frame2 排在 frame10 之前"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name.lower())]
+
+
+def list_frames(folder):
+    """文件夹中按自然顺序排列的逐帧图片路径"""
+    names = [f for f in os.listdir(folder) if f.lower().endswith(FRAME_EXTENSIONS)]
+    return [os.path.join(folder, f) for f in sorted(names, key=natural_key)]
+
+
+def frame_canvas(paths):
+    """只读文件头，返回能容纳所有帧的画布尺寸 (w, h)"""
+    width = height = 0
+    for path in paths:
+        with Image.open(path) as img:
+            w, h = img.size
+        width, height = max(width, w), max(height, h)
+    return width, height
+
+
+def decode_frame(path, canvas=None, anchor="center"):
+    """解码为 RGBA 数组；尺寸小于画布时放到透明画布上（居中或左上角对齐）"""
+    with Image.open(path) as img:
+        arr = np.asarray(img.convert("RGBA"))
+    h, w = arr.shape[:2]
+    if canvas is None or canvas == (w, h):
+        return arr
+    canvas_w, canvas_h = canvas
+    out = np.zeros((canvas_h, canvas_w, 4), dtype=np.uint8)
+    x, y = ((canvas_w - w) // 2, (canvas_h - h) // 2) if anchor == "center" else (0, 0)
+    out[y:y + h, x:x + w] = arr
+    return out
+
+
+def read_frames(paths, canvas=None, workers=None, anchor="center"):
+    """在线程池上并行解码，按顺序逐帧产出 RGBA 数组
+
+    同时在途（已提交解码、尚未被取走）的帧数不超过 workers 的两倍。
+    """
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        submitted = (pool.submit(decode_frame, path, canvas, anchor) for path in paths)
+        for future in bounded(submitted, workers * 2):
+            yield future.result()
+
+
+def encode_folder(folder, format="webp", fps=12, loop=0, workers=None, anchor="center",
+                  encode_workers=None, executor=None):
+    """把逐帧图片文件夹编码成一个动画
+
+    帧按自然顺序排列，统一到最大帧的画布尺寸，解码线程池和编码线程池流水线并行。
+    返回 FolderResult（data 为动画字节串，没有帧时为 None）。
+    """
+    paths = list_frames(folder)
+    if not paths:
+        return FolderResult(None, 0, (0, 0), 0.0)
+    start = time.perf_counter()
+    canvas = frame_canvas(paths)
+    frames = read_frames(paths, canvas, workers, anchor)
+    data = encode_frames(frames, format, fps, loop, encode_workers, executor)
+    return FolderResult(data, len(paths), canvas, time.perf_counter() - start)
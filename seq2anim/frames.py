@@ -0,0 +1,78 @@
+import numpy as np
+from PIL import Image
+
+from .apng import encode_apng_animation
+from .gif import encode_gif_animation
+from .palette import padded_palette, palette_image
+from .util import write_bytes
+from .webp import encode_webp_animation
+
+FORMATS = ("webp", "apng", "gif")
+EXTENSIONS = {"webp": "webp", "apng": "png", "gif": "gif"}  # 各格式输出文件的扩展名
+
+
+def frame_duration(fps):
+    """每帧时长（毫秒），与各脚本一直使用的 int(1000 / fps) 保持一致"""
+    return int(1000 / fps)
+
+
+def encode_frames(frames, format="webp", fps=12, loop=0, workers=None, executor=None, palette=None, quality=None):
+    """把帧（列表或生成器，均为同尺寸的 RGBA 数组）编码为动画字节串，边读边编码
+
+    传入 palette 时帧是 (h, w) 的调色板下标数组：apng / gif 直接输出索引色，
+    webp 没有索引色模式，在送进编码器前逐帧展开成 RGBA。
+    quality 只对 webp 有效：None 为无损，否则为有损编码的质量 (0-100)。
+    """
+    duration = frame_duration(fps)
+    if format == "webp":
+        if palette is not None:
+            lut = padded_palette(palette)
+            frames = (lut[f] for f in frames)
+        lossless = quality is None
+        return encode_webp_animation(frames, duration, loop, lossless, 80 if lossless else quality,
+                                     workers=workers, executor=executor)
+    if format == "apng":
+        return encode_apng_animation(frames, duration, loop, workers=workers, executor=executor, palette=palette)
+    if format == "gif":
+        return encode_gif_animation(frames, duration, loop, palette)
+    raise ValueError(f"不支持的格式: {format}")
+
+
+class FrameSet:
+    """切好的动画帧；帧是序列图数组上的视图，直到编码前都不复制像素"""
+
+    def __init__(self, frames, grid=None, boxes=None, palette=None):
+        self.frames = list(frames)
+        self.grid = grid
+        self.boxes = boxes
+        self.palette = palette  # 不为 None 时帧是调色板下标数组
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    @property
+    def size(self):
+        h, w = self.frames[0].shape[:2]
+        return w, h
+
+    def images(self):
+        """转换为 PIL 图像列表（会复制像素，供预览等需要 PIL 的地方使用）"""
+        if self.palette is not None:
+            return [palette_image(f, self.palette) for f in self.frames]
+        return [Image.fromarray(np.ascontiguousarray(f), "RGBA") for f in self.frames]
+
+    def encode(self, format="webp", fps=12, loop=0, workers=None, executor=None):
+        """编码为动画字节串（webp 为无损动画 WebP，apng 为 APNG，gif 为 GIF）"""
+        if not self.frames:
+            raise ValueError("没有可编码的帧")
+        return encode_frames(self.frames, format, fps, loop, workers, executor, self.palette)
+
+    def save(self, outpath, format="webp", fps=12, loop=0, workers=None, executor=None):
+        """编码并写入文件（路径或文件对象），返回写入的字节数"""
+        return write_bytes(outpath, self.encode(format, fps, loop, workers, executor))
@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from .palette import padded_palette
+from .util import write_bytes
+
+GIF_ALPHA_CUTOFF = 128  # GIF 只有一个全透明下标，alpha 低于此值的条目都映射到它
+
+
+def _transparent_remap(lut):
+    """返回 (透明下标, 下标重映射表)；所有 alpha 低于阈值的条目合并到第一个这样的条目"""
+    transparent = lut[:, 3] < GIF_ALPHA_CUTOFF
+    remap = np.arange(256, dtype=np.uint8)
+    if not transparent.any():
+        return None, remap
+    index = int(np.argmax(transparent))
+    remap[transparent] = index
+    return index, remap
+
+
+def encode_gif_animation(frames, duration, loop=0, palette=None):
+    """编码动画 GIF，返回字节串
+
+    传入 palette 时帧是调色板下标数组，直接按原调色板写出，不做颜色量化；
+    否则帧是 RGBA 数组，由 Pillow 逐帧量化到 256 色。帧之间“显示后清除为背景”。
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("没有可编码的帧")
+    options = {"save_all": True, "duration": duration, "loop": loop, "disposal": 2, "optimize": False}
+    if palette is not None:
+        lut = padded_palette(palette)
+        index, remap = _transparent_remap(lut)
+        if index is not None:
+            options["transparency"] = index
+        rgb = lut[:, :3].tobytes()
+
+        def to_image(frame):
+            img = Image.fromarray(remap[frame], "P")
+            img.putpalette(rgb)
+            return img
+    else:
+        def to_image(frame):
+            return Image.fromarray(np.ascontiguousarray(frame), "RGBA")
+    buf = io.BytesIO()
+    to_image(first).save(buf, "GIF", append_images=(to_image(f) for f in frames), **options)
+    return buf.getvalue()
+
+
+def save_gif_animation(frames, outpath, duration, loop=0, palette=None):
+    """编码 GIF 并写入文件（路径或文件对象）"""
+    data = encode_gif_animation(frames, duration, loop, palette)
+    return write_bytes(outpath, data)
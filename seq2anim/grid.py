@@ -0,0 +1,202 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+class GridSpec(namedtuple("GridSpec", "rows cols")):
+    """序列图的行列划分；每格大小为整除后的宽高，余下的像素被忽略"""
+
+    def cell_size(self, size):
+        w, h = size
+        return w // self.cols, h // self.rows
+
+    def boxes(self, size):
+        """按行优先返回每格的 (left, top, right, bottom)"""
+        frame_w, frame_h = self.cell_size(size)
+        return [(x * frame_w, y * frame_h, (x + 1) * frame_w, (y + 1) * frame_h)
+                for y in range(self.rows) for x in range(self.cols)]
+
+
+def opaque_mask(alpha, alpha_threshold, out=None):
+    """alpha >= alpha_threshold 的布尔掩码；传入 out 时复用调用方的缓冲区"""
+    return np.greater_equal(alpha, alpha_threshold, out=out)
+
+
+class OccupancyIndex:
+    """阈值化 alpha 掩码的积分图（summed-area table），任意矩形的不透明像素数只需查 4 个值
+
+    table[y, x] 为 [0, y) × [0, x) 内的不透明像素数（多一行一列 0 作为边界）。
+    用 uint32 保存并按模 2^32 相减：单个矩形的计数不会超过 2^32，所以即使总数溢出结果也正确。
+    内存与 RGBA 序列图相同（每像素 4 字节），所以 Sheet 每张图只保留一张（见 Sheet.occupancy）。
+    """
+
+    def __init__(self, alpha, alpha_threshold=1, out=None):
+        h, w = alpha.shape
+        self.alpha_threshold = alpha_threshold
+        self.table = np.zeros((h + 1, w + 1), dtype=np.uint32)
+        opaque = opaque_mask(alpha, alpha_threshold, out)
+        # 先沿行内（内存连续方向）累加，再逐行累加，比反过来快约 3 倍
+        np.cumsum(opaque, axis=1, dtype=np.uint32, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=0, out=self.table[1:, 1:])
+
+    @property
+    def shape(self):
+        h, w = self.table.shape
+        return h - 1, w - 1
+
+    def count(self, left, top, right, bottom):
+        """矩形 [left, right) × [top, bottom) 内的不透明像素数"""
+        t = self.table
+        return int(t[bottom, right] - t[top, right] - t[bottom, left] + t[top, left])
+
+    def counts(self, ys, xs):
+        """以 ys、xs 为分界的各矩形的不透明像素数，返回 (len(ys)-1, len(xs)-1) 的数组"""
+        corners = self.table[np.asarray(ys)[:, None], np.asarray(xs)[None, :]]
+        return (corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]).astype(np.int64)
+
+    def row_counts(self):
+        """每一行的不透明像素数"""
+        return np.diff(self.table[:, -1]).astype(np.int64)
+
+    def cell_counts(self, grid):
+        """网格每一格的不透明像素数，(rows, cols)"""
+        if not isinstance(grid, GridSpec):
+            grid = GridSpec(*grid)
+        h, w = self.shape
+        frame_w, frame_h = grid.cell_size((w, h))
+        return self.counts(np.arange(grid.rows + 1) * frame_h, np.arange(grid.cols + 1) * frame_w)
+
+
+def detect_max_rows(opaque, max_rows, debug=False):
+    """从最大行开始递减，找到每行上下边缘都透明的最大行数
+
+    opaque 为布尔掩码或 OccupancyIndex。
+    """
+    h = opaque.shape[0]
+    row_opaque = opaque.row_counts() > 0 if isinstance(opaque, OccupancyIndex) else opaque.any(axis=1)
+
+    for rows in range(max_rows, 0, -1):
+        frame_h = h // rows
+        tops = np.arange(rows) * frame_h
+        failed = row_opaque[tops] | row_opaque[tops + frame_h - 1]
+        if failed.any():
+            if debug:
+                print(f"行检测失败: rows={rows}, 切片{int(failed.argmax())}, top/bottom有不透明像素")
+            continue
+        if debug:
+            print(f"✅ 最大有效行数: {rows}")
+        return rows
+    if debug:
+        print("⚠️ 找不到符合条件的行，默认1行")
+    return 1
+
+
+def detect_max_cols(opaque, max_cols, rows, debug=False):
+    """从最大列开始递减，找到每列左右边缘（在每个行切片内）都透明的最大列数
+
+    opaque 为布尔掩码或 OccupancyIndex。
+    """
+    h, w = opaque.shape
+    frame_h = h // rows
+    # (rows, w)：每个行切片内每一列是否有不透明像素
+    if isinstance(opaque, OccupancyIndex):
+        slice_opaque = opaque.counts(np.arange(rows + 1) * frame_h, np.arange(w + 1)) > 0
+    else:
+        slice_opaque = opaque[:rows * frame_h].reshape(rows, frame_h, w).any(axis=1)
+
+    for cols in range(max_cols, 0, -1):
+        frame_w = w // cols
+        lefts = np.arange(cols) * frame_w
+        failed = slice_opaque[:, lefts] | slice_opaque[:, lefts + frame_w - 1]
+        if failed.any():
+            if debug:
+                j = int(failed.any(axis=0).argmax())
+                i = int(failed[:, j].argmax())
+                print(f"列检测失败: cols={cols}, 切片({i},{j}), left/right有不透明像素")
+            continue
+        if debug:
+            print(f"✅ 最大有效列数: {cols}")
+        return cols
+    if debug:
+        print("⚠️ 找不到符合条件的列，默认1列")
+    return 1
+
+
+def predict_layout(alpha, limit=50):
+    """按 alpha 投影中不透明区段的个数估计行列数（图片分割工具的预测方式）"""
+    def count_segments(projection):
+        binary = (projection > 0).astype(int)
+        if not np.any(binary):
+            return 1
+        changes = np.diff(binary, prepend=0, append=0)
+        return len(np.where(changes == 1)[0])
+
+    row_p = np.max(alpha, axis=1)
+    col_p = np.max(alpha, axis=0)
+    return GridSpec(max(1, min(limit, count_segments(row_p))), max(1, min(limit, count_segments(col_p))))
+
+
+GridConfidence = namedtuple("GridConfidence", "score boundaries occupancy agreement")
+
+
+def grid_confidence(alpha, grid, alpha_threshold=28, max_rows=20, max_cols=20, index=None, edge_grid=None,
+                    layout=None):
+    """给检测到的网格打分（0~1），用于判断是否可以不经人工确认直接切分
+
+    boundaries：每条格子边缘（上下左右各一像素）完全透明的比例；
+    occupancy：非空格子的不透明像素数是否接近（1 - 变异系数），空格子不在末尾时减半；
+    agreement：边缘检测与投影计数两种方法的结果一致为 1，否则为 0.5。
+    score 为三者之积。index 为同一阈值的 OccupancyIndex（不传时临时建立）；
+    edge_grid / layout 为两种方法的检测结果，给同一张图的多个候选网格打分时由调用方只算一次再传入。
+    """
+    if not isinstance(grid, GridSpec):
+        grid = GridSpec(*grid)
+    if index is None:
+        index = OccupancyIndex(alpha, alpha_threshold)
+    h, w = index.shape
+    frame_w, frame_h = grid.cell_size((w, h))
+    if frame_w == 0 or frame_h == 0:
+        return GridConfidence(0.0, 0.0, 0.0, 0.0)
+    tops = np.arange(grid.rows) * frame_h
+    lefts = np.arange(grid.cols) * frame_w
+    rights = np.arange(grid.cols + 1) * frame_w
+    bottoms = np.arange(grid.rows + 1) * frame_h
+
+    # 每格上下左右各一像素宽的边缘是否有不透明像素
+    row_edges = [np.stack([ys, ys + 1], axis=1).ravel() for ys in (tops, tops + frame_h - 1)]
+    col_edges = [np.stack([xs, xs + 1], axis=1).ravel() for xs in (lefts, lefts + frame_w - 1)]
+    edges = np.concatenate([index.counts(ys, rights)[::2].ravel() for ys in row_edges] +
+                           [index.counts(bottoms, xs)[:, ::2].ravel() for xs in col_edges]) > 0
+    boundaries = 1.0 - float(edges.mean())
+
+    counts = index.cell_counts(grid).ravel()
+    filled = counts > 0
+    if not filled.any():
+        return GridConfidence(0.0, boundaries, 0.0, 0.0)
+    occupancy = max(0.0, 1.0 - float(counts[filled].std() / counts[filled].mean()))
+    # 动画帧应从头开始连续排列，空格子只出现在末尾
+    if not filled[:int(filled.sum())].all():
+        occupancy *= 0.5
+
+    if edge_grid is None:
+        edge_grid = detect_grid(alpha, max_rows, max_cols, alpha_threshold, index=index)
+    if layout is None:
+        layout = predict_layout(alpha)
+    agreement = 1.0 if edge_grid == grid and layout == grid else 0.5
+    return GridConfidence(boundaries * occupancy * agreement, boundaries, occupancy, agreement)
+
+
+def detect_grid(alpha, max_rows=20, max_cols=20, alpha_threshold=28, method="edges", debug=False, out=None,
+                index=None):
+    """检测序列图的网格
+
+    method="edges"：行列边缘透明检测（批量脚本的方式）；
+    method="projection"：alpha 投影区段计数（图片分割工具的方式）。
+    传入 index（同一阈值的 OccupancyIndex）时直接在积分图上检测。
+    """
+    if method == "projection":
+        return predict_layout(alpha)
+    opaque = index if index is not None else opaque_mask(alpha, alpha_threshold, out)
+    rows = detect_max_rows(opaque, max_rows, debug)
+    cols = detect_max_cols(opaque, max_cols, rows, debug)
+    return GridSpec(rows, cols)
@@ -0,0 +1,60 @@
+import numpy as np
+from PIL import Image
+
+PALETTE_SIZE = 256
+
+
+def image_palette(img):
+    """P 模式图像的 RGBA 调色板，返回 (n, 4) 的 uint8 数组
+
+    透明度来自 PNG 的 tRNS：Pillow 放在 info["transparency"] 中，
+    多个条目时是逐条目的 alpha 字节串，只有一个透明条目时是它的下标。
+    """
+    rgb = np.array(img.getpalette() or [], dtype=np.uint8).reshape(-1, 3)
+    palette = np.full((len(rgb), 4), 255, dtype=np.uint8)
+    palette[:, :3] = rgb
+    transparency = img.info.get("transparency")
+    if isinstance(transparency, bytes):
+        alpha = np.frombuffer(transparency, dtype=np.uint8)[:len(palette)]
+        palette[:len(alpha), 3] = alpha
+    elif isinstance(transparency, int) and transparency < len(palette):
+        palette[transparency, 3] = 0
+    return palette
+
+
+def padded_palette(palette):
+    """补齐到 256 个条目的查找表，超出调色板的下标按完全透明处理，任意 uint8 下标都可以直接查表"""
+    lut = np.zeros((PALETTE_SIZE, 4), dtype=np.uint8)
+    lut[:len(palette)] = palette[:PALETTE_SIZE]
+    return lut
+
+
+def expand(indices, palette):
+    """下标数组 → RGBA 数组（只在最终编码或显示时调用）"""
+    return padded_palette(palette)[indices]
+
+
+def palette_image(indices, palette):
+    """下标数组和调色板 → P 模式 PIL 图像（调色板的 alpha 写入 tRNS）"""
+    img = Image.fromarray(np.ascontiguousarray(indices), "P")
+    img.putpalette(np.ascontiguousarray(palette).tobytes(), "RGBA")
+    return img
+
+
+def clean_palette(palette, indices, alpha_threshold):
+    """调色板图的透明像素清理，返回 (新调色板, 新下标数组, 被修改的像素数)
+
+    alpha 低于阈值的条目置为 (0, 0, 0, 0)，效果等同于 RGBA 的 "zero" 模式；
+    这些条目再合并成同一个下标（一次查表），透明区域才能像 RGBA 清零后一样压缩。
+    "bleed" 需要新增颜色，调色板图不支持，同样按清零处理。
+    """
+    cleared = palette[:, 3] < alpha_threshold
+    changed = cleared & palette.any(axis=1)
+    if not changed.any():
+        return palette, indices, 0
+    counts = np.bincount(indices.ravel(), minlength=PALETTE_SIZE)[:len(palette)]
+    palette = palette.copy()
+    palette[cleared] = 0
+    remap = np.arange(PALETTE_SIZE, dtype=np.uint8)
+    remap[:len(palette)][cleared] = np.argmax(cleared)
+    return palette, remap[indices], int(counts[changed].sum())
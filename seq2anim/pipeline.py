@@ -0,0 +1,263 @@
+import asyncio
+import io
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .budget import fit_to_budget
+from .convert import Converter
+from .sheet import Sheet, _is_palette_file, estimate_memory
+
+StageStats = namedtuple("StageStats", "name workers items busy blocked utilisation depth max_depth")
+PipelineResult = namedtuple("PipelineResult", "path target grid frame_count error")
+
+_DONE = object()  # 队列结束标记
+
+
+class MemoryBudget:
+    """按字节计的异步信号量：预留超出上限时等待；没有任何预留时单个超大的任务也放行"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, size):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+            self.peak = max(self.peak, self.used)
+
+    async def release(self, size):
+        async with self._changed:
+            self.used -= size
+            self._changed.notify_all()
+
+
+class Stage:
+    """流水线的一级：输入队列 + 若干个在 executor 上运行 func 的协程"""
+
+    def __init__(self, name, func, workers, executor, queue_size):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.executor = executor
+        self.queue = asyncio.Queue(queue_size)
+        self.items = 0
+        self.busy = 0.0     # 各协程执行 func 的累计秒数
+        self.blocked = 0.0  # 下一级队列已满、等待放入的累计秒数（下游是瓶颈）
+        self.max_depth = 0
+
+    def stats(self, elapsed):
+        capacity = elapsed * self.workers
+        return StageStats(self.name, self.workers, self.items, self.busy, self.blocked,
+                          self.busy / capacity if capacity else 0.0, self.queue.qsize(), self.max_depth)
+
+
+class Job:
+    """在各级之间传递的一张序列图"""
+
+    def __init__(self, path, reserved):
+        self.path = path
+        self.reserved = reserved
+        self.data = None
+        self.cached = None
+        self.sheet = None
+        self.grid = None
+        self.frames = None
+        self.frame_count = None
+        self.encoded = None
+        self.target = None
+
+
+def estimate_bytes(path, keep_palette=False):
+    """只读文件头估算峰值内存（见 estimate_memory）"""
+    with Image.open(path) as img:
+        return estimate_memory(*img.size, indexed=keep_palette and img.mode == "P")[1]
+
+
+def format_stats(stats):
+    """每级一行：处理数、利用率、被下游阻塞的时间、当前/最大队列深度"""
+    return [f"{s.name:<7} {s.items:>5} 个  利用率 {s.utilisation:6.1%}  阻塞 {s.blocked:6.2f}s  "
+            f"队列 {s.depth}/{s.max_depth}" for s in stats]
+
+
+class ConvertPipeline:
+    """读盘 → 解码 → 检测切帧 → 编码 → 写出 的分级流水线，各级之间是有界队列
+
+    读和写在 I/O 线程池上运行，解码、检测和编码在各自的线程池上运行（PIL 解码、
+    numpy 和编码器都会释放 GIL），所以磁盘和 CPU 可以重叠。每张图进入流水线前
+    按文件头估算内存并在 MemoryBudget 中预留，写出后释放，超出预算时读盘等待。
+    检测级只有一个线程，复用同一个 Converter 的掩码缓冲区；逐帧编码共用它的线程池。
+
+    传入 max_bytes 时编码级按字节预算自动选择设置（见 budget.fit_to_budget）。
+    sink(path, data) 负责写出一张图的结果并返回目标（路径等，用于日志），
+    在写出级的线程中调用；write_workers 为 1 时 sink 不需要线程安全。
+    stats() 返回各级的 StageStats，流水线运行期间也可以调用，用于找出限制吞吐的那一级：
+    利用率接近 100% 的是瓶颈，上游各级的“阻塞”时间会随之增长。
+    """
+
+    def __init__(self, sink, format="webp", fps=12, alpha_threshold=28, max_rows=20, max_cols=20, cleanup=None,
+                 keep_palette=False, cache=None, io_workers=4, decode_workers=2, encode_jobs=2, write_workers=1,
+                 encode_workers=None, queue_size=2, memory_budget=4 << 30, max_bytes=None):
+        self.sink = sink
+        self.format = format
+        self.fps = fps
+        self.alpha_threshold = alpha_threshold
+        self.max_rows = max_rows
+        self.max_cols = max_cols
+        self.cleanup = cleanup
+        self.keep_palette = keep_palette
+        self.cache = cache
+        self.io_workers = io_workers
+        self.converter = Converter(encode_workers, cache)
+        self.memory_budget = memory_budget
+        self.queue_size = queue_size
+        self.max_bytes = max_bytes
+        self.stage_specs = [("read", self._read, io_workers, "io"),
+                            ("decode", self._decode, decode_workers, "decode"),
+                            ("detect", self._detect, 1, "detect"),
+                            ("encode", self._encode, encode_jobs, "encode"),
+                            ("write", self._write, write_workers, "io")]
+        self.stages = []
+        self.started = None
+        self.budget = None
+
+    def _read(self, job):
+        # 与 Sheet.open 一致：保持索引色的调色板图不经过解码缓存
+        if self.cache is not None and not (self.keep_palette and _is_palette_file(job.path)):
+            job.cached = self.cache.get(job.path)
+            if job.cached is not None:
+                return job  # 命中时解码级直接使用 mmap 数组
+        with open(job.path, "rb") as f:
+            job.data = f.read()
+        return job
+
+    def _decode(self, job):
+        name = os.path.basename(job.path)
+        if job.cached is not None:
+            job.sheet, job.cached = Sheet(job.cached, name), None
+            return job
+        job.sheet = Sheet.open(io.BytesIO(job.data), name, keep_palette=self.keep_palette)
+        job.data = None
+        if self.cache is not None and job.sheet.palette is None:
+            job.sheet = Sheet(self.cache.put(job.path, job.sheet.array), name)
+        return job
+
+    def _detect(self, job):
+        if self.cleanup:
+            job.sheet.cleanup(self.alpha_threshold, self.cleanup)
+        job.grid = self.converter.detect(job.sheet, self.max_rows, self.max_cols, self.alpha_threshold)
+        job.frames = job.sheet.split(job.grid)
+        job.frame_count = len(job.frames)
+        return job if job.frame_count else None
+
+    def _encode(self, job):
+        if self.max_bytes:
+            job.encoded = fit_to_budget(job.frames, self.max_bytes, self.format, self.fps, 0,
+                                        self.converter.workers, self.converter.executor).data
+        else:
+            job.encoded = job.frames.encode(self.format, self.fps, workers=self.converter.workers,
+                                            executor=self.converter.executor)
+        job.sheet = job.frames = None  # 编码完就不再需要像素
+        return job
+
+    def _write(self, job):
+        job.target = self.sink(job.path, job.encoded)
+        job.encoded = None
+        return job
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return [stage.stats(elapsed) for stage in self.stages]
+
+    def run(self, paths, on_report=None, report_every=5.0):
+        """处理所有文件，返回 PipelineResult 列表（按完成顺序）；
+        on_report(stats) 每隔 report_every 秒被调用一次"""
+        try:
+            return asyncio.run(self._run(paths, on_report, report_every))
+        finally:
+            self.converter.close()
+
+    async def _run(self, paths, on_report, report_every):
+        loop = asyncio.get_running_loop()
+        self.budget = MemoryBudget(self.memory_budget)
+        pools = {"io": ThreadPoolExecutor(max_workers=self.io_workers)}
+        self.stages = []
+        for name, func, workers, pool in self.stage_specs:
+            if pool not in pools:
+                pools[pool] = ThreadPoolExecutor(max_workers=workers)
+            self.stages.append(Stage(name, func, workers, pools[pool], self.queue_size))
+        results = []
+        self.started = time.perf_counter()
+
+        async def finish(job, error=None):
+            """任务离开流水线（写完、无有效帧或出错）时释放内存预留"""
+            await self.budget.release(job.reserved)
+            job.data = job.cached = job.sheet = job.frames = job.encoded = None
+            results.append(PipelineResult(job.path, job.target, job.grid, job.frame_count, error))
+
+        async def worker(index):
+            stage = self.stages[index]
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            while True:
+                job = await stage.queue.get()
+                if job is _DONE:
+                    return
+                started = time.perf_counter()
+                try:
+                    done = await loop.run_in_executor(stage.executor, stage.func, job)
+                except Exception as e:
+                    stage.busy += time.perf_counter() - started
+                    await finish(job, e)
+                    continue
+                stage.busy += time.perf_counter() - started
+                stage.items += 1
+                if done is None or downstream is None:
+                    await finish(job)
+                    continue
+                started = time.perf_counter()
+                await downstream.queue.put(done)
+                stage.blocked += time.perf_counter() - started
+                downstream.max_depth = max(downstream.max_depth, downstream.queue.qsize())
+
+        async def run_stage(index):
+            stage = self.stages[index]
+            await asyncio.gather(*(worker(index) for _ in range(stage.workers)))
+            if index + 1 < len(self.stages):
+                following = self.stages[index + 1]
+                for _ in range(following.workers):
+                    await following.queue.put(_DONE)
+
+        async def feed():
+            first = self.stages[0]
+            for path in paths:
+                try:
+                    reserved = await loop.run_in_executor(pools["io"], estimate_bytes, path, self.keep_palette)
+                except (OSError, ValueError) as e:
+                    results.append(PipelineResult(path, None, None, None, e))
+                    continue
+                await self.budget.acquire(reserved)
+                await first.queue.put(Job(path, reserved))
+                first.max_depth = max(first.max_depth, first.queue.qsize())
+            for _ in range(first.workers):
+                await first.queue.put(_DONE)
+
+        async def report():
+            while True:
+                await asyncio.sleep(report_every)
+                on_report(self.stats())
+
+        reporter = asyncio.create_task(report()) if on_report else None
+        try:
+            await asyncio.gather(feed(), *(run_stage(i) for i in range(len(self.stages))))
+        finally:
+            if reporter:
+                reporter.cancel()
+            for pool in pools.values():
+                pool.shutdown()
+        return results
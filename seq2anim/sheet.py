@@ -0,0 +1,218 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from .cleanup import clean_transparent_pixels
+from .frames import FrameSet
+from .grid import GridSpec, OccupancyIndex, detect_grid, opaque_mask
+from .palette import clean_palette, image_palette, padded_palette, palette_image
+
+PEAK_FACTOR = 3  # 处理一张图时的峰值内存约为解码后大小的倍数（原图 + 检测数组 + 帧/编码缓冲）
+
+
+def _rgba_array(array):
+    """把 (h, w, 3/4) 的 uint8 数组整理成 RGBA；已经是 RGBA 时不复制"""
+    if array.dtype != np.uint8 or array.ndim != 3 or array.shape[2] not in (3, 4):
+        raise ValueError(f"需要 (h, w, 3/4) 的 uint8 数组，实际为 {array.dtype} {array.shape}")
+    if array.shape[2] == 4:
+        return array
+    rgba = np.empty(array.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = array
+    rgba[..., 3] = 255
+    return rgba
+
+
+def estimate_memory(width, height, indexed=False, frames=1):
+    """按尺寸估算 (解码后字节数, 峰值字节数)
+
+    保持索引色的调色板图（IndexedSheet）每像素 1 字节，其余都转换成 RGBA；
+    动画输入按帧数累计。batch_plan 的预估和 ConvertPipeline 的内存预留都用这里的数字。
+    """
+    decoded = width * height * (1 if indexed else 4) * frames
+    return decoded, decoded * PEAK_FACTOR
+
+
+def _is_palette_file(path):
+    """只读文件头，判断是否为调色板（P 模式）图片"""
+    with Image.open(path) as img:
+        return img.mode == "P"
+
+
+class Sheet:
+    """一张解码后的序列图，像素保存在 (h, w, 4) 的 RGBA 数组中"""
+
+    palette = None
+
+    def __init__(self, array, name=None):
+        self.array = _rgba_array(array)
+        self.name = name
+        self._occupancy = {}
+
+    @classmethod
+    def open(cls, source, name=None, cache=None, keep_palette=False):
+        """从文件路径、字节串、文件对象、numpy 数组或 PIL 图像创建
+
+        传入 cache（SheetCache）时，文件路径优先从解码缓存中以只读 mmap 打开。
+        keep_palette 为 True 时，调色板图片返回 IndexedSheet（每像素 1 字节，不经过缓存）。
+        """
+        if isinstance(source, Sheet):
+            return source
+        if isinstance(source, np.ndarray):
+            return cls(source, name)
+        if isinstance(source, Image.Image):
+            if keep_palette and source.mode == "P":
+                return IndexedSheet.from_image(source, name)
+            return cls(np.array(source.convert("RGBA")), name)
+        if isinstance(source, (str, os.PathLike)):
+            name = name or os.path.basename(source)
+            if cache is not None and not (keep_palette and _is_palette_file(source)):
+                return cls(cache.load(source), name)
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        else:
+            name = name or os.path.basename(getattr(source, "name", "") or "") or None
+        with Image.open(source) as img:
+            if keep_palette and img.mode == "P":
+                return IndexedSheet.from_image(img, name)
+            return cls(np.array(img.convert("RGBA")), name)
+
+    @property
+    def size(self):
+        h, w = self.array.shape[:2]
+        return w, h
+
+    @property
+    def alpha(self):
+        return self.array[..., 3]
+
+    @property
+    def image(self):
+        """PIL 图像（与数组共享内存）"""
+        return Image.fromarray(self.array, "RGBA")
+
+    def copy(self):
+        return Sheet(self.array.copy(), self.name)
+
+    def opaque(self, alpha_threshold, out=None):
+        """alpha >= alpha_threshold 的布尔掩码；out 为可复用的缓冲区"""
+        return opaque_mask(self.alpha, alpha_threshold, out)
+
+    def occupancy(self, alpha_threshold=1, out=None, build=True):
+        """alpha >= alpha_threshold 的积分图（OccupancyIndex）
+
+        积分图和 RGBA 序列图一样大（每像素 4 字节），所以每张图只保留一张：换阈值时替换原来的。
+        界面按检测阈值建表，检测、打分、有效帧数和切帧都查这一张。
+        默认阈值 1 即“有任何不透明像素”。out 为建表时临时掩码可复用的布尔缓冲区。
+        build 为 False 时只返回已建好的同一阈值的积分图，没有时返回 None（不建表）。
+        """
+        index = self._occupancy.get(alpha_threshold)
+        if index is None and build:
+            self._occupancy.clear()  # 先释放旧表，峰值不会同时有两张
+            index = self._occupancy[alpha_threshold] = self._build_occupancy(alpha_threshold, out)
+        return index
+
+    def _build_occupancy(self, alpha_threshold, out):
+        return OccupancyIndex(self.alpha, alpha_threshold, out)
+
+    def _current_occupancy(self):
+        """已建的积分图（不论阈值），没有时为 None"""
+        return next(iter(self._occupancy.values()), None)
+
+    def detect_grid(self, max_rows=20, max_cols=20, alpha_threshold=28, method="edges", debug=False, out=None):
+        index = self.occupancy(alpha_threshold, build=False) if method == "edges" else None
+        return detect_grid(self.alpha, max_rows, max_cols, alpha_threshold, method, debug, out, index)
+
+    def frame_count(self, grid):
+        """按网格切分后的有效帧数，只查积分图，不切帧
+
+        已建积分图时直接用它（界面按检测阈值建表，只有低于该阈值像素的格子也算空帧，
+        开启透明像素清理时这些像素本来就会被清掉），否则建阈值 1 的积分图。
+        """
+        index = self._current_occupancy() or self.occupancy()
+        return int(np.count_nonzero(index.cell_counts(grid)))
+
+    def cleanup(self, alpha_threshold, mode="zero"):
+        """编码前清理透明像素（见 cleanup.clean_transparent_pixels），返回被修改的像素数"""
+        if not self.array.flags.writeable:
+            self.array = self.array.copy()
+        changed = clean_transparent_pixels(self.array, alpha_threshold, mode)
+        if changed:
+            self._occupancy.clear()  # 低于阈值的 alpha 被清零，积分图需要重建
+        return changed
+
+    def split(self, grid, skip_empty=True):
+        """按网格切帧，默认跳过完全透明的格子；返回的帧是数组视图"""
+        if not isinstance(grid, GridSpec):
+            grid = GridSpec(*grid)
+        frames = []
+        boxes = []
+        # 已建积分图时（交互界面）查表判断空帧，与 frame_count 的标准一致；否则直接检查每格的 alpha（单次切分更快）
+        index = self._current_occupancy() if skip_empty else None
+        counts = index.cell_counts(grid).ravel() if index is not None else None
+        for i, box in enumerate(grid.boxes(self.size)):
+            left, top, right, bottom = box
+            frame = self.array[top:bottom, left:right]
+            if frame.size == 0:
+                continue
+            if skip_empty and not (counts[i] if counts is not None else self._visible(frame)):  # 跳过完全透明帧
+                continue
+            frames.append(frame)
+            boxes.append(box)
+        return FrameSet(frames, grid, boxes, self.palette)
+
+    def _visible(self, frame):
+        return frame[..., 3].any()
+
+
+class IndexedSheet(Sheet):
+    """调色板序列图：像素保存为 (h, w) 的 uint8 下标数组，颜色和透明度都来自调色板
+
+    内存是 RGBA 的四分之一。检测用的掩码和 alpha 通过调色板查表得到，
+    切出的帧仍是下标数组的视图，只有编码 WebP 时才逐帧展开成 RGBA。
+    """
+
+    def __init__(self, indices, palette, name=None):
+        if indices.dtype != np.uint8 or indices.ndim != 2:
+            raise ValueError(f"需要 (h, w) 的 uint8 下标数组，实际为 {indices.dtype} {indices.shape}")
+        self.array = indices
+        self.palette = np.asarray(palette, dtype=np.uint8)
+        self.name = name
+        self._occupancy = {}
+
+    @classmethod
+    def from_image(cls, img, name=None):
+        return cls(np.array(img), image_palette(img), name)
+
+    @property
+    def alpha(self):
+        """按调色板查表得到的 alpha（每次调用都会生成新数组）"""
+        return padded_palette(self.palette)[:, 3][self.array]
+
+    @property
+    def image(self):
+        return palette_image(self.array, self.palette)
+
+    def copy(self):
+        return IndexedSheet(self.array.copy(), self.palette.copy(), self.name)
+
+    def opaque(self, alpha_threshold, out=None):
+        """直接用调色板的布尔查找表生成掩码，不经过 alpha 数组"""
+        lut = padded_palette(self.palette)[:, 3] >= alpha_threshold
+        return np.take(lut, self.array, out=out)
+
+    def _build_occupancy(self, alpha_threshold, out):
+        index = OccupancyIndex(self.opaque(alpha_threshold, out), 1)
+        index.alpha_threshold = alpha_threshold
+        return index
+
+    def cleanup(self, alpha_threshold, mode="zero"):
+        """清理调色板并合并透明条目（见 palette.clean_palette），"bleed" 按 "zero" 处理"""
+        self.palette, self.array, changed = clean_palette(self.palette, self.array, alpha_threshold)
+        if changed:
+            self._occupancy.clear()
+        return changed
+
+    def _visible(self, frame):
+        return padded_palette(self.palette)[:, 3].astype(bool)[frame].any()
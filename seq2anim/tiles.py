@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+BAND_ROWS = 256
+
+
+def downsample(array, band_rows=BAND_ROWS):
+    """2x2 平均缩小一半（奇数的最后一行/列被忽略），按行带处理，不生成整图大小的临时数组"""
+    h, w = array.shape[0] // 2, array.shape[1] // 2
+    out = np.empty((h, w, array.shape[2]), dtype=np.uint8)
+    for y0 in range(0, h, band_rows):
+        y1 = min(h, y0 + band_rows)
+        band = array[2 * y0:2 * y1, :2 * w].astype(np.uint16)
+        total = band[0::2, 0::2] + band[0::2, 1::2] + band[1::2, 0::2] + band[1::2, 1::2]
+        out[y0:y1] = (total + 2) >> 2
+    return out
+
+
+class TilePyramid:
+    """序列图的多级缩略金字塔，按 tile_size 的方块取图
+
+    第 0 级就是原数组（可以是 mmap），不复制；第 k 级宽高为原图的 1/2^k。
+    build() 在后台线程中逐级生成缩小的层级；某一级还没生成时，tile() 从原图
+    隔行隔列取样返回近似图块，所以任何缩放下取图的开销都只和图块大小有关。
+    """
+
+    def __init__(self, array, tile_size=256, min_size=256):
+        self.tile_size = tile_size
+        self.levels = [array]
+        h, w = array.shape[:2]
+        count = 1
+        while max(h, w) >> count >= min_size:
+            count += 1
+        self.level_count = count
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        h, w = self.levels[0].shape[:2]
+        return w, h
+
+    def level_size(self, level):
+        w, h = self.size
+        return w >> level, h >> level
+
+    def ready(self, level):
+        return level < len(self.levels)
+
+    def level_for_scale(self, scale):
+        """显示比例（屏幕像素 / 原图像素）对应的层级：该级的分辨率不低于屏幕所需"""
+        level = 0
+        while level + 1 < self.level_count and scale * (1 << (level + 1)) <= 1:
+            level += 1
+        return level
+
+    def tile_grid(self, level):
+        """该层级的 (列数, 行数)"""
+        w, h = self.level_size(level)
+        return -(-w // self.tile_size), -(-h // self.tile_size)
+
+    def tile(self, level, tx, ty):
+        """返回 (图块数组, 是否为精确结果)；图块为 C 连续的 (h, w, 4) uint8"""
+        w, h = self.level_size(level)
+        x0, y0 = tx * self.tile_size, ty * self.tile_size
+        x1, y1 = min(w, x0 + self.tile_size), min(h, y0 + self.tile_size)
+        with self._lock:
+            source = self.levels[level] if level < len(self.levels) else None
+        if source is not None:
+            return np.ascontiguousarray(source[y0:y1, x0:x1]), True
+        step = 1 << level
+        sample = self.levels[0][y0 * step:y1 * step:step, x0 * step:x1 * step:step]
+        return np.ascontiguousarray(sample), False
+
+    def build(self, on_level=None, cancelled=None):
+        """逐级生成缩小的层级；每完成一级调用 on_level(level)，cancelled() 为真时提前停止"""
+        while len(self.levels) < self.level_count:
+            if cancelled is not None and cancelled():
+                return False
+            level = downsample(self.levels[-1])
+            with self._lock:
+                self.levels.append(level)
+            if on_level is not None:
+                on_level(len(self.levels) - 1)
+        return True
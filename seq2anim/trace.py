@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.children = []
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        stack = self.tracer._stack()
+        stack.pop()
+        ms = (end - self.start) * 1000
+        if stack:
+            stack[-1].children.append((self.name, ms))
+        else:
+            self.tracer._finish(self.name, ms, self.children)
+        self.tracer._write({"name": self.name, "ph": "X", "ts": self.tracer._us(self.start),
+                            "dur": round(ms * 1000, 1), "pid": os.getpid(), "tid": threading.get_ident()})
+        return False
+
+
+class Tracer:
+    """交互延迟记录：最近一次调用的分步耗时（供界面叠加显示）和预览帧间隔
+
+    path 不为空时同时写出 Chrome trace 文件（JSON 数组格式），可以直接拖进
+    chrome://tracing 或 ui.perfetto.dev 查看。事件逐条追加写入，程序中途退出时
+    文件也可以加载。path 为空且 hud 为 False 时所有调用都是空操作。
+    """
+
+    def __init__(self, path=None, hud=False, slow_frame_ms=50, history=120):
+        self.enabled = bool(path or hud)
+        self.hud = hud
+        self.slow_frame_ms = slow_frame_ms
+        self.history = history
+        self.last = OrderedDict()  # 顶层步骤名 → (总耗时 ms, [(子步骤名, ms)])
+        self.frames = {}           # 帧计时名 → (上一帧时间, 最近的帧间隔 ms)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._file = None
+        self._first = True
+        if path:
+            self._file = open(path, "w", encoding="utf-8")
+            self._file.write("[\n")
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _us(self, t):
+        return round((t - self._origin) * 1e6, 1)
+
+    def _finish(self, name, ms, children):
+        with self._lock:
+            self.last.pop(name, None)
+            self.last[name] = (ms, children)
+
+    def _write(self, event):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.write(("" if self._first else ",\n") + json.dumps(event, ensure_ascii=False))
+            self._first = False
+            self._file.flush()
+
+    def span(self, name):
+        """with tracer.span("步骤"): ...；嵌套的 span 记为外层步骤的子步骤"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def frame(self, name="frame"):
+        """在每次呈现一帧后调用，记录帧间隔；超过 slow_frame_ms 的慢帧写入 trace"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        previous, intervals = self.frames.get(name, (None, None))
+        if intervals is None:
+            intervals = deque(maxlen=self.history)
+        if previous is not None:
+            ms = (now - previous) * 1000
+            intervals.append(ms)
+            if ms > self.slow_frame_ms:
+                self._write({"name": f"slow {name}", "ph": "X", "ts": self._us(previous), "dur": round(ms * 1000, 1),
+                             "pid": os.getpid(), "tid": threading.get_ident(), "args": {"ms": round(ms, 1)}})
+        self.frames[name] = (now, intervals)
+
+    def summary_lines(self):
+        """叠加显示用的文字行（英文，pygame 默认字体没有中文字形）"""
+        lines = []
+        with self._lock:
+            last = list(self.last.items())
+        for name, (ms, children) in last:
+            steps = " | ".join(f"{child} {child_ms:.1f}" for child, child_ms in children)
+            lines.append(f"{name} {ms:.1f}ms" + (f": {steps}" if steps else ""))
+        for name, (_, intervals) in self.frames.items():
+            if intervals:
+                avg = sum(intervals) / len(intervals)
+                fps = 1000 / avg if avg else 0
+                lines.append(f"{name} avg {avg:.1f}ms ({fps:.0f}fps) max {max(intervals):.1f}ms")
+        return lines
+
+    def draw_hud(self, screen, font):
+        """在 pygame 窗口左上角叠加显示 summary_lines（screen 为 Surface，font 为 pygame 字体）"""
+        y = 5
+        for line in self.summary_lines():
+            surface = font.render(line, True, (255, 255, 0), (0, 0, 0))
+            screen.blit(surface, (5, y))
+            y += surface.get_height() + 2
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.write("\n]\n")
+                self._file.close()
+                self._file = None
@@ -0,0 +1,30 @@
+from collections import deque
+
+
+def write_bytes(outpath, data):
+    """把字节串写入路径或文件对象，返回写入的字节数"""
+    if hasattr(outpath, "write"):
+        outpath.write(data)
+    else:
+        with open(outpath, "wb") as f:
+            f.write(data)
+    return len(data)
+
+
+def drain(pending, limit=1):
+    """从 pending（deque）左端依次取出元素，直到剩余不足 limit 个；默认全部取出"""
+    while len(pending) >= limit:
+        yield pending.popleft()
+
+
+def bounded(submitted, limit):
+    """按顺序产出 submitted 中的元素（通常是 Future 或带 Future 的元组），同时在途的不超过 limit 个
+
+    submitted 应该是惰性的（生成器每产出一个元素才提交一个任务），这样生产者只会领先消费者
+    limit 个任务，边解码边编码时内存只与线程数有关，与帧数无关。
+    """
+    pending = deque()
+    for item in submitted:
+        pending.append(item)
+        yield from drain(pending, limit)
+    yield from drain(pending)
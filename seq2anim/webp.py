@@ -0,0 +1,188 @@
+import io
+import os
+import struct
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+from PIL import Image
+
+from .util import bounded, write_bytes
+
+# ANMF 标志位：bit1 = 不混合，bit0 = 显示后清除为背景
+ANMF_NO_BLEND = 0x02
+ANMF_DISPOSE_BACKGROUND = 0x01
+
+# libwebp 压缩力度 (0-6)。0 与 Pillow 保存动画时的默认值一致；
+# 4 在 41 帧 280x280 的无损序列上小约 37%，但单核编码耗时约为 12 倍（0.08s → 0.97s）
+DEFAULT_METHOD = 0
+
+# VP8X 标志位
+VP8X_ALPHA = 0x10
+VP8X_ANIMATION = 0x02
+
+
+def _chunk(fourcc, payload):
+    """拼装 RIFF 子块（长度字段不含奇数补齐字节）"""
+    data = fourcc + struct.pack("<I", len(payload)) + payload
+    if len(payload) & 1:
+        data += b"\x00"
+    return data
+
+
+def _uint24(value):
+    return struct.pack("<I", value)[:3]
+
+
+def iter_chunks(data, offset=12):
+    """遍历 WebP 文件中的子块，返回 (fourcc, payload)"""
+    end = len(data)
+    while offset + 8 <= end:
+        fourcc = data[offset:offset + 4]
+        size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        yield fourcc, data[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+
+
+def index_chunks(f):
+    """iter_chunks 的文件版本：只读取子块头部建立索引，返回 [(fourcc, 数据偏移, 长度)]，不读入图像数据"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        raise ValueError("不是 WebP 文件")
+    riff_end = 8 + struct.unpack("<I", header[4:8])[0]
+    chunks = []
+    offset = 12
+    while offset + 8 <= riff_end:
+        f.seek(offset)
+        head = f.read(8)
+        if len(head) < 8:
+            break
+        size = struct.unpack("<I", head[4:8])[0]
+        chunks.append((head[:4], offset + 8, size))
+        offset += 8 + size + (size & 1)
+    return chunks
+
+
+def _alpha_box(frame):
+    """返回非透明区域的包围盒，左上角对齐到偶数坐标（ANMF 偏移以 2 像素为单位）"""
+    h, w = frame.shape[:2]
+    if frame.shape[2] < 4:
+        return 0, 0, w, h
+    alpha = frame[..., 3]
+    ys = np.flatnonzero(alpha.any(axis=1))
+    if not ys.size:
+        return 0, 0, w, h
+    xs = np.flatnonzero(alpha.any(axis=0))
+    return int(xs[0]) & ~1, int(ys[0]) & ~1, int(xs[-1]) + 1, int(ys[-1]) + 1
+
+
+def _as_array(frame):
+    """帧可以是 PIL 图像或 (h, w, 3/4) 的 uint8 数组（可以是序列图上的视图）"""
+    if isinstance(frame, np.ndarray):
+        return frame
+    if frame.mode not in ("RGBA", "RGB"):
+        frame = frame.convert("RGBA")
+    return np.asarray(frame)
+
+
+def _encode_frame(mode, size, raw, lossless, quality, method):
+    """单帧编码为静态 WebP，只保留 ALPH / VP8 / VP8L 图像数据块"""
+    frame = Image.frombytes(mode, size, raw)
+    buf = io.BytesIO()
+    frame.save(buf, "WEBP", lossless=lossless, quality=quality, method=method)
+    data = buf.getvalue()
+    payload = b""
+    has_alpha = False
+    for fourcc, chunk in iter_chunks(data):
+        if fourcc == b"ALPH":
+            has_alpha = True
+            payload += _chunk(fourcc, chunk)
+        elif fourcc == b"VP8 ":
+            payload += _chunk(fourcc, chunk)
+        elif fourcc == b"VP8L":
+            # VP8L 头部第 28 位为 alpha_is_used
+            has_alpha = has_alpha or bool(chunk[4] & 0x10)
+            payload += _chunk(fourcc, chunk)
+    return payload, has_alpha
+
+
+def encode_webp_frames(frames, durations, lossless=True, quality=80, method=DEFAULT_METHOD,
+                       workers=None, executor=None):
+    """并行编码每一帧，按顺序产出 (x, y, w, h, duration, payload, has_alpha)
+
+    frames 可以是任意可迭代对象（列表或生成器），同时在途的帧数被限制在
+    workers 的两倍以内，因此可以边解码边编码。传入 executor 时复用调用方的池。
+    """
+    workers = workers or os.cpu_count() or 1
+    durations = repeat(durations) if isinstance(durations, int) else iter(durations)
+
+    def submit_all(pool):
+        for frame in frames:
+            arr = _as_array(frame)
+            box = _alpha_box(arr)
+            left, top, right, bottom = box
+            crop = np.ascontiguousarray(arr[top:bottom, left:right])
+            mode = "RGBA" if crop.shape[2] == 4 else "RGB"
+            future = pool.submit(_encode_frame, mode, (right - left, bottom - top), crop.tobytes(),
+                                 lossless, quality, method)
+            yield box, next(durations), future
+
+    with (nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=workers)) as pool:
+        for item in bounded(submit_all(pool), workers * 2):
+            yield _finish(item)
+
+
+def _finish(item):
+    box, duration, future = item
+    payload, has_alpha = future.result()
+    left, top, right, bottom = box
+    return left, top, right - left, bottom - top, duration, payload, has_alpha
+
+
+def mux_webp_animation(encoded, canvas_size, loop=0, background=(0, 0, 0, 0)):
+    """把已编码的帧拼装成 RIFF/VP8X/ANIM/ANMF 动画容器，返回字节串
+
+    每帧都使用“不混合 + 显示后清除为背景”，帧之间互不依赖，
+    裁剪到非透明区域后与整帧输出的显示效果一致。
+    """
+    canvas_w, canvas_h = canvas_size
+    body = []
+    any_alpha = False
+    for x, y, w, h, duration, payload, has_alpha in encoded:
+        any_alpha = any_alpha or has_alpha
+        header = (_uint24(x // 2) + _uint24(y // 2) + _uint24(w - 1) + _uint24(h - 1)
+                  + _uint24(min(int(duration), 0xFFFFFF))
+                  + bytes([ANMF_NO_BLEND | ANMF_DISPOSE_BACKGROUND]))
+        body.append(_chunk(b"ANMF", header + payload))
+
+    flags = VP8X_ANIMATION | (VP8X_ALPHA if any_alpha else 0)
+    vp8x = _chunk(b"VP8X", bytes([flags, 0, 0, 0]) + _uint24(canvas_w - 1) + _uint24(canvas_h - 1))
+    r, g, b, a = background
+    anim = _chunk(b"ANIM", bytes([b, g, r, a]) + struct.pack("<H", loop))
+    content = b"WEBP" + vp8x + anim + b"".join(body)
+    return b"RIFF" + struct.pack("<I", len(content)) + content
+
+
+def encode_webp_animation(frames, duration, loop=0, lossless=True, quality=80, method=DEFAULT_METHOD,
+                          workers=None, executor=None):
+    """并行编码并封装动画 WebP，返回字节串（method 的大小/速度取舍见 DEFAULT_METHOD）"""
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("没有可编码的帧")
+
+    def all_frames():
+        yield first
+        yield from frames
+
+    encoded = encode_webp_frames(all_frames(), duration, lossless, quality, method, workers, executor)
+    height, width = _as_array(first).shape[:2]
+    return mux_webp_animation(list(encoded), (width, height), loop)
+
+
+def save_webp_animation(frames, outpath, duration, loop=0, lossless=True, quality=80, method=DEFAULT_METHOD,
+                        workers=None, executor=None):
+    """并行编码动画 WebP 并写入文件（路径或文件对象）"""
+    data = encode_webp_animation(frames, duration, loop, lossless, quality, method, workers, executor)
+    return write_bytes(outpath, data)
@@ -1,135 +1,230 @@
+import io
 import os
-import numpy as np
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+
+from batch_plan import plan_batch, print_plan
+from seq2anim import (EXTENSIONS, ArchiveWriter, ConvertPipeline, FrameSet, Sheet, SheetCache, default_converter,
+                      describe, encode_folder, fit_to_budget, format_stats, list_frames, write_bytes)
+from seq2anim.archive import INDEX_SUFFIX
 
 # ========== 可调参数 ==========
 input_folder = "/Users/nayuchuanmei/Documents/[需要处理的]"      # 输入文件夹路径
 output_folder = "output"       # 输出文件夹路径
 fps = 12                       # 动画帧率
-format = "webp"                # 可选 "webp" 或 "apng"
+format = "webp"                # 可选 "webp"、"apng" 或 "gif"
 alpha_threshold = 28          # alpha 阈值 (0-255)
 max_rows = 20                  # 最大行分割数
 max_cols = 20                  # 最大列分割数
 debug = True                   # 是否打印调试信息
+encode_workers = None           # WebP/APNG 并行编码线程数（None 为 CPU 核数）
+batch_workers = 4              # 同时处理的文件数（进程数）
+memory_budget_mb = 4096        # 同时处理的文件峰值内存合计上限 (MB)
+alpha_cleanup = None           # 编码前清理透明像素: None / "zero"（RGB清零）/ "bleed"（填充相邻颜色）
+alpha_cleanup_report = False   # 对比未清理时的大小：每个输出多做一次完整编码（编码耗时约翻倍），只在评估清理效果时打开
+sheet_cache_mb = 0             # 解码后序列图的磁盘缓存上限 (MB)，0 为关闭；一次性批处理不会命中，只在反复处理同一批图时打开（目录见 SEQ2ANIM_CACHE）
+input_mode = "sheet"           # "sheet"：每张 PNG 是一张序列图；"frames"：每个子文件夹（没有子文件夹时为输入文件夹本身）是一组逐帧图片
+decode_workers = None          # 逐帧模式的并行解码线程数（None 为 CPU 核数）
+keep_palette = False           # 调色板 PNG 全程保持索引色（内存约为 RGBA 的 1/4），apng/gif 输出索引色；会改变 apng 输出，默认关闭
+size_budget_kb = None          # 每个动画的大小上限 (KB)：依次尝试无损、有损质量搜索、缩小/抽帧；None 为不限制
+overlap_stages = False         # 单进程分级流水线：读盘、解码、检测、编码、写出重叠进行（代替多进程批处理）
+io_workers = 4                 # 流水线的读写线程数
+decode_workers_per_stage = 2   # 流水线的解码线程数
+encode_jobs = 2                # 流水线中同时编码的图片数（每张图的帧再由 encode_workers 并行编码）
+output_archive = None          # 例如 "output/animations.zip" 或 ".tar"：所有动画写进一个归档（旁边写偏移索引）；None 为每个输入一个文件
 # ==============================
 
-os.makedirs(output_folder, exist_ok=True)
-
-def detect_max_rows(img, max_rows, alpha_threshold):
-    """从最大行开始递减，找到每行上下边缘都透明的最大行数"""
-    w, h = img.size
-    arr = np.array(img)
-
-    for rows in range(max_rows, 0, -1):
-        frame_h = h // rows
-        all_clear = True
-        for i in range(rows):
-            top = arr[i*frame_h, :, 3]
-            bottom = arr[(i+1)*frame_h-1, :, 3]
-            if np.any(top >= alpha_threshold) or np.any(bottom >= alpha_threshold):
-                all_clear = False
-                if debug:
-                    print(f"行检测失败: rows={rows}, 切片{i}, top/bottom有不透明像素")
-                break
-        if all_clear:
-            if debug:
-                print(f"✅ 最大有效行数: {rows}")
-            return rows
-    if debug:
-        print("⚠️ 找不到符合条件的行，默认1行")
-    return 1
-
-def detect_max_cols(img, max_cols, alpha_threshold, rows):
-    """从最大列开始递减，找到每列左右边缘都透明的最大列数"""
-    w, h = img.size
-    arr = np.array(img)
-
-    for cols in range(max_cols, 0, -1):
-        frame_w = w // cols
-        all_clear = True
-        for j in range(cols):
-            left = arr[:, j*frame_w, 3]
-            right = arr[:, (j+1)*frame_w-1, 3]
-            for i in range(rows):
-                slice_top = i * (h // rows)
-                slice_bottom = (i+1) * (h // rows)
-                if np.any(left[slice_top:slice_bottom] >= alpha_threshold) or np.any(right[slice_top:slice_bottom] >= alpha_threshold):
-                    all_clear = False
-                    if debug:
-                        print(f"列检测失败: cols={cols}, 切片({i},{j}), left/right有不透明像素")
-                    break
-            if not all_clear:
-                break
-        if all_clear:
-            if debug:
-                print(f"✅ 最大有效列数: {cols}")
-            return cols
-    if debug:
-        print("⚠️ 找不到符合条件的列，默认1列")
-    return 1
+sheet_cache = SheetCache(max_bytes=sheet_cache_mb * 2 ** 20) if sheet_cache_mb else None
 
-def split_and_animate(filepath):
-    img = Image.open(filepath).convert("RGBA")
-    w, h = img.size
+def output_path(filepath, folder=None):
+    """输入文件对应的动画输出路径"""
+    filename = os.path.splitext(os.path.basename(filepath))[0]
+    return os.path.join(folder or output_folder, f"{filename}.{EXTENSIONS[format]}")
+
+def split_and_animate(filepath, outpath=None, converter=None):
+    """分割并生成动画，返回写入的路径或文件对象（无有效帧时返回 None）"""
+    converter = converter or default_converter(encode_workers)
+    sheet = Sheet.open(filepath, cache=sheet_cache, keep_palette=keep_palette)
+    w, h = sheet.size
     if debug:
-        print(f"\n处理文件: {filepath}, 尺寸: {w}x{h}")
+        print(f"\n处理文件: {filepath}, 尺寸: {w}x{h}" + (f"，{len(sheet.palette)} 色调色板" if sheet.palette is not None else ""))
+    if alpha_cleanup:
+        original = sheet.copy() if alpha_cleanup_report else None
+        cleaned = sheet.cleanup(alpha_threshold, alpha_cleanup)
 
-    rows = detect_max_rows(img, max_rows, alpha_threshold)
-    cols = detect_max_cols(img, max_cols, alpha_threshold, rows)
+    grid = converter.detect(sheet, max_rows, max_cols, alpha_threshold, debug=debug)
+    rows, cols = grid
 
     if debug:
         print(f"最终分割结果: {cols} 列 x {rows} 行")
 
-    frame_w = w // cols
-    frame_h = h // rows
-
-    frames = []
-    for y in range(rows):
-        for x in range(cols):
-            box = (x*frame_w, y*frame_h, (x+1)*frame_w, (y+1)*frame_h)
-            frame = img.crop(box)
-            arr = np.array(frame)
-            if np.all(arr[..., 3] == 0):  # 跳过完全透明帧
-                continue
-            frames.append(frame)
-
-    if not frames:
+    frames = sheet.split(grid)
+    if not len(frames):
         print(f"⚠️ 跳过 {os.path.basename(filepath)}（无有效帧）")
-        return
+        return None
 
-    duration = int(1000 / fps)
     filename = os.path.splitext(os.path.basename(filepath))[0]
-    outpath = os.path.join(output_folder, f"{filename}.{ 'webp' if format=='webp' else 'png' }")
-
-    if format == "webp":
-        frames[0].save(
-            outpath,
-            save_all=True,
-            append_images=frames[1:],
-            duration=duration,
-            loop=0,
-            disposal=2,
-            lossless=True
-        )
+    outpath = outpath or output_path(filepath)
+    target = getattr(outpath, "name", outpath)
+    if size_budget_kb:
+        budget = size_budget_kb * 1024
+        tuned = fit_to_budget(frames, budget, format, fps, 0, converter.workers, converter.executor)
+        write_bytes(outpath, tuned.data)
+        size = len(tuned.data)
+        print(f"✅ {filename}: {cols}x{rows} 网格 → {tuned.frame_count}帧，{describe(tuned.settings)} → {target}")
+        print(f"{'🎯' if tuned.fits else '⚠️'} {filename}: {size} / {budget} 字节"
+              f"{'' if tuned.fits else '（所有设置都超出预算，使用最小的结果）'}，共编码 {tuned.encodes} 次")
     else:
-        from apng import APNG
-        temp_files = []
-        for idx, f in enumerate(frames):
-            tmp = os.path.join(output_folder, f"tmp_{idx}.png")
-            f.save(tmp)
-            temp_files.append(tmp)
-        apng = APNG()
-        for f in temp_files:
-            apng.append_file(f, delay=duration)
-        apng.save(outpath)
-        for f in temp_files:
-            os.remove(f)
-
-    print(f"✅ {filename}: {cols}x{rows} 网格 → {len(frames)}帧，{fps}fps → {outpath}")
+        size = frames.save(outpath, format, fps, loop=0, workers=converter.workers, executor=converter.executor)
+        print(f"✅ {filename}: {cols}x{rows} 网格 → {len(frames)}帧，{fps}fps → {target}")
+    if alpha_cleanup:
+        message = f"🧹 {filename}: 清理 {cleaned} 个透明像素，输出 {size} 字节"
+        if alpha_cleanup_report and not size_budget_kb:
+            # 未清理时的大小只能再编码一次得到
+            raw_frames = FrameSet([original.array[t:b, l:r] for l, t, r, b in frames.boxes], palette=original.palette)
+            raw_size = len(raw_frames.encode(format, fps, workers=converter.workers, executor=converter.executor))
+            message += f"（未清理 {raw_size} 字节，节省 {1 - size / raw_size:.1%}）"
+        print(message)
+    return outpath
+
+def folder_to_animation(folder, outpath=None, converter=None):
+    """逐帧图片文件夹 → 一个动画，边解码边编码；返回写入的路径（没有帧时返回 None）"""
+    converter = converter or default_converter(encode_workers)
+    name = os.path.basename(os.path.normpath(folder))
+    outpath = outpath or output_path(name)
+    result = encode_folder(folder, format, fps, loop=0, workers=decode_workers,
+                           encode_workers=converter.workers, executor=converter.executor)
+    if result.data is None:
+        print(f"⚠️ 跳过 {name}（没有帧图片）")
+        return None
+    write_bytes(outpath, result.data)
+
+    w, h = result.canvas
+    megapixels = result.frame_count * w * h / 1e6
+    print(f"✅ {name}: {result.frame_count}帧 {w}x{h}，{fps}fps → {getattr(outpath, 'name', outpath)}")
+    if debug:
+        print(f"   耗时 {result.seconds:.2f}s，{result.frame_count / result.seconds:.1f} 帧/s，"
+              f"{megapixels / result.seconds:.1f} 百万像素/s")
+    return outpath
+
+def frame_folders(folder):
+    """逐帧模式的输入：含帧图片的子文件夹；没有子文件夹时就是输入文件夹本身"""
+    subfolders = [os.path.join(folder, d) for d in sorted(os.listdir(folder))
+                  if os.path.isdir(os.path.join(folder, d))]
+    subfolders = [d for d in subfolders if list_frames(d)]
+    return subfolders or [folder]
+
+def archive_entry(path):
+    """输入文件或逐帧文件夹在归档中的条目名"""
+    return os.path.basename(output_path(os.path.normpath(path)))
+
+def animate_to_bytes(path, func=None):
+    """在内存中生成动画（归档模式的工作函数），返回字节串；无有效帧时返回 None"""
+    buf = io.BytesIO()
+    buf.name = f"{os.path.basename(output_archive or 'archive')}/{archive_entry(path)}"  # 只用于日志
+    if (func or split_and_animate)(path, buf) is None:
+        return None
+    return buf.getvalue()
+
+def run_batch(paths, workers=None, memory_budget=None, archive=None):
+    """按文件头估算的计划，最大的文件先调度，并按内存预算限制同时运行的进程
+
+    传入 archive（ArchiveWriter）时工作进程只返回编码结果，由主进程按完成顺序追加到归档。
+    """
+    workers = workers or batch_workers
+    memory_budget = memory_budget or memory_budget_mb * 2 ** 20
+    plan = plan_batch(paths, keep_palette, format=format)
+    if debug:
+        print_plan(plan, workers, memory_budget)
+    job = split_and_animate if archive is None else animate_to_bytes
+
+    def finish(item, result):
+        if archive is not None and result is not None:
+            archive.add(archive_entry(item.path), result)
+
+    if workers <= 1:
+        for item in plan:
+            try:
+                finish(item, job(item.path))
+            except Exception as e:
+                print(f"❌ {os.path.basename(item.path)}: {e}")
+        return
+
+    queue = list(plan)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while queue or running:
+            in_use = sum(item.peak_bytes for item in running.values())
+            # 严格按从大到小的顺序提交，超出预算时等待；什么都没在跑时超预算的大文件单独放行
+            while queue and len(running) < workers:
+                item = queue[0]
+                if running and in_use + item.peak_bytes > memory_budget:
+                    break
+                queue.pop(0)
+                running[pool.submit(job, item.path)] = item
+                in_use += item.peak_bytes
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                try:
+                    finish(item, future.result())
+                except Exception as e:
+                    print(f"❌ {os.path.basename(item.path)}: {e}")
+
+def run_pipeline(paths, archive=None):
+    """单进程分级流水线处理（见 seq2anim.ConvertPipeline），结束时打印各级的利用率和队列深度"""
+    def sink(path, data):
+        if archive is not None:
+            entry = archive_entry(path)
+            archive.add(entry, data)
+            target = f"{os.path.basename(output_archive)}/{entry}"
+        else:
+            target = output_path(path)
+            write_bytes(target, data)
+        print(f"✅ {os.path.basename(path)}: {len(data)} 字节 → {target}")
+        return target
+
+    def report(stats):
+        print("⏱ 流水线: " + " | ".join(f"{s.name} {s.utilisation:.0%} 队列{s.depth}" for s in stats))
+
+    pipeline = ConvertPipeline(sink, format, fps, alpha_threshold, max_rows, max_cols, alpha_cleanup, keep_palette,
+                               sheet_cache, io_workers, decode_workers_per_stage, encode_jobs,
+                               encode_workers=encode_workers, memory_budget=memory_budget_mb * 2 ** 20,
+                               max_bytes=size_budget_kb * 1024 if size_budget_kb else None)
+    results = pipeline.run(paths, report if debug else None)
+    for result in results:
+        if result.error is not None:
+            print(f"❌ {os.path.basename(result.path)}: {result.error}")
+        elif result.target is None:
+            print(f"⚠️ 跳过 {os.path.basename(result.path)}（无有效帧）")
+    if debug:
+        print(f"流水线统计（内存预留峰值 {pipeline.budget.peak / 2 ** 20:.0f}MB）:")
+        for line in format_stats(pipeline.stats()):
+            print("  " + line)
+    return results
 
 # 批量处理
-for file in os.listdir(input_folder):
-    if file.lower().endswith(".png"):
-        split_and_animate(os.path.join(input_folder, file))
+if __name__ == "__main__":
+    os.makedirs(output_folder, exist_ok=True)
+    archive = ArchiveWriter(output_archive) if output_archive else None
+    with archive if archive is not None else nullcontext():
+        if input_mode == "frames":
+            for folder in frame_folders(input_folder):
+                if archive is None:
+                    folder_to_animation(folder)
+                else:
+                    data = animate_to_bytes(folder, folder_to_animation)
+                    if data is not None:
+                        archive.add(archive_entry(folder), data)
+        else:
+            paths = [os.path.join(input_folder, file) for file in os.listdir(input_folder)
+                     if file.lower().endswith(".png")]
+            if overlap_stages:
+                run_pipeline(paths, archive)
+            else:
+                run_batch(paths, archive=archive)
+    if archive is not None:
+        print(f"📦 {len(archive)} 个动画 → {output_archive}（索引 {output_archive}{INDEX_SUFFIX}）")
+
+    print("🎬 全部处理完成。")
 
-print("🎬 全部处理完成。")
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+from seq2anim import FORMATS, default_converter
+
+# ========== 可调参数 ==========
+host = "127.0.0.1"             # 只监听本机
+port = 8765                    # 端口
+process_workers = os.cpu_count() or 1  # 检测和编码的进程数
+queue_size = 8                 # 进程全忙时最多排队的请求数，超出返回 429
+encode_threads = 2             # 每个进程内的编码线程数
+max_upload_mb = 256            # 单次上传大小上限 (MB)
+keep_palette = False           # 调色板 PNG 保持索引色处理（见 seq2anim.IndexedSheet），apng 输出变为索引色
+# ==============================
+
+STREAM_CHUNK = 1 << 16
+DISCARD_TIMEOUT = 10  # 拒绝请求后读掉剩余上传内容的最长等待秒数
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 422: "Unprocessable Entity", 429: "Too Many Requests",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+CONTENT_TYPES = {"webp": "image/webp", "apng": "image/apng", "gif": "image/gif"}
+
+
+def _convert_job(data, params):
+    """在工作进程中运行；每个进程的默认转换器（线程池、缓冲区）在请求之间复用"""
+    started = time.perf_counter()
+    result = default_converter(encode_threads).convert(data, keep_palette=keep_palette, **params)
+    return result.data, tuple(result.grid), result.frame_count, result.settings, time.perf_counter() - started
+
+
+def parse_params(query):
+    """解析 fps / format / alpha_threshold / rows / cols / max_kb，参数不合法时抛出 ValueError"""
+    values = {key: items[-1] for key, items in parse_qs(query).items()}
+    params = {
+        "fps": float(values.get("fps", 12)),
+        "format": values.get("format", "webp"),
+        "alpha_threshold": int(values.get("alpha_threshold", 28)),
+        "rows": int(values["rows"]) if values.get("rows") else None,
+        "cols": int(values["cols"]) if values.get("cols") else None,
+        "max_bytes": int(values["max_kb"]) * 1024 if values.get("max_kb") else None,
+    }
+    if params["format"] not in FORMATS:
+        raise ValueError(f"format 只能是 {', '.join(FORMATS)}")
+    if not 0 < params["fps"] <= 1000:
+        raise ValueError("fps 超出范围")
+    if not 0 <= params["alpha_threshold"] <= 255:
+        raise ValueError("alpha_threshold 超出范围 (0-255)")
+    for key in ("rows", "cols", "max_bytes"):
+        if params[key] is not None and params[key] < 1:
+            raise ValueError(f"{key} 必须大于 0")
+    return params
+
+
+class ConversionServer:
+    """本地 HTTP 转换服务：POST /convert 上传序列图，返回动画；GET /healthz、/metrics"""
+
+    def __init__(self, workers=None, queue=None):
+        self.workers = workers or process_workers
+        self.capacity = self.workers + (queue_size if queue is None else queue)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.in_flight = 0
+        self.started = time.time()
+        self.metrics = {"requests": {}, "convert_seconds": 0.0, "converted": 0,
+                        "bytes_in": 0, "bytes_out": 0, "rejected": 0}
+
+    async def handle(self, reader, writer):
+        status = 500
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, _ = request_line.split(" ", 2)
+            except ValueError:
+                status = await self.respond_error(writer, 400, "请求行格式错误")
+                return
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            status = await self.route(method, urlsplit(target), headers, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # 客户端中途断开，没有可以回复的对象
+            status = 499
+        finally:
+            self.metrics["requests"][status] = self.metrics["requests"].get(status, 0) + 1
+            writer.close()
+
+    async def route(self, method, url, headers, reader, writer):
+        if url.path == "/healthz":
+            body = {"status": "ok", "in_flight": self.in_flight, "capacity": self.capacity}
+            return await self.respond(writer, 200, json.dumps(body).encode(), "application/json")
+        if url.path == "/metrics":
+            return await self.respond(writer, 200, self.render_metrics().encode(), "text/plain; version=0.0.4")
+        if url.path != "/convert":
+            return await self.respond_error(writer, 404, "未知路径")
+        if method != "POST":
+            return await self.respond_error(writer, 405, "只支持 POST")
+
+        value = headers.get("content-length", "")
+        if not (value.isascii() and value.isdigit()):
+            # 长度未知（或为负数）时无法读掉上传内容，直接回复并关闭
+            return await self.respond_error(writer, 400, "需要合法的 Content-Length")
+        length = int(value)
+        # 带 Expect: 100-continue 的客户端（curl 上传超过 1MB 时）要等到 100 Continue 才发送请求体；
+        # 被拒绝时它不会再发送，也就没有要读掉的内容
+        expect_continue = headers.get("expect", "").lower() == "100-continue"
+        unsent = 0 if expect_continue else length
+        try:
+            params = parse_params(url.query)
+        except ValueError as e:
+            return await self.reject(reader, writer, unsent, 400, str(e))
+        if length > max_upload_mb * 2 ** 20:
+            return await self.reject(reader, writer, unsent, 413, "上传文件过大")
+        # 在读取上传内容之前做准入控制，满载时立即拒绝
+        if self.in_flight >= self.capacity:
+            self.metrics["rejected"] += 1
+            return await self.reject(reader, writer, unsent, 429, "服务繁忙，请稍后重试", {"Retry-After": "1"})
+
+        self.in_flight += 1
+        try:
+            if expect_continue:
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            data = await reader.readexactly(length)
+            self.metrics["bytes_in"] += length
+            loop = asyncio.get_running_loop()
+            try:
+                result, grid, frame_count, settings, seconds = await loop.run_in_executor(
+                    self.pool, _convert_job, data, params)
+            except BrokenProcessPool:
+                # 工作进程异常退出（例如被 OOM 杀掉）是服务端的问题，不是输入的问题；换一个新的进程池
+                self.restart_pool()
+                return await self.respond_error(writer, 503, "转换进程异常退出，请稍后重试", {"Retry-After": "1"})
+            except MemoryError:
+                return await self.respond_error(writer, 500, "内存不足")
+            except Exception as e:
+                return await self.respond_error(writer, 422, f"无法转换: {e}")
+        finally:
+            self.in_flight -= 1
+
+        if result is None:
+            return await self.respond_error(writer, 422, "没有有效帧")
+        self.metrics["converted"] += 1
+        self.metrics["convert_seconds"] += seconds
+        self.metrics["bytes_out"] += len(result)
+        extra = {"X-Grid": f"{grid[0]}x{grid[1]}", "X-Frames": str(frame_count)}
+        if settings is not None:
+            # 按 max_kb 自动选择的设置，例如 "lossless=0; quality=67; scale=0.5; fps=6"
+            extra["X-Encode-Settings"] = (f"lossless={int(settings.lossless)}; quality={settings.quality}; "
+                                          f"scale={settings.scale:g}; fps={settings.fps:g}")
+        return await self.stream(writer, 200, result, CONTENT_TYPES[params["format"]], extra)
+
+    async def respond(self, writer, status, body, content_type, extra=None):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{key}: {value}" for key, value in (extra or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        return status
+
+    async def respond_error(self, writer, status, message, extra=None):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode()
+        return await self.respond(writer, status, body, "application/json; charset=utf-8", extra)
+
+    async def reject(self, reader, writer, length, status, message, extra=None):
+        """不读上传内容就回复错误：先发出回复并半关闭写端，再读掉（至多 max_upload_mb）剩余内容才关闭连接
+
+        连接关闭时如果还有未读的数据，内核会发送 RST，客户端往往还没读到回复就被重置。
+        """
+        await self.respond_error(writer, status, message, extra)
+        remaining = min(length, max_upload_mb * 2 ** 20)
+        try:
+            if writer.can_write_eof():
+                writer.write_eof()
+            while remaining > 0:
+                chunk = await asyncio.wait_for(reader.read(min(STREAM_CHUNK, remaining)), DISCARD_TIMEOUT)
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        return status
+
+    async def stream(self, writer, status, body, content_type, extra=None):
+        """分块传输结果，每块写完后等待 drain，慢客户端不会让服务端堆积内存"""
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", f"Content-Type: {content_type}",
+                "Transfer-Encoding: chunked", "Connection: close"]
+        head += [f"{key}: {value}" for key, value in (extra or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+        view = memoryview(body)
+        for offset in range(0, len(body), STREAM_CHUNK):
+            chunk = view[offset:offset + STREAM_CHUNK]
+            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return status
+
+    def render_metrics(self):
+        """Prometheus 文本格式"""
+        lines = [f"seq2anim_uptime_seconds {time.time() - self.started:.0f}",
+                 f"seq2anim_in_flight {self.in_flight}",
+                 f"seq2anim_capacity {self.capacity}",
+                 f"seq2anim_workers {self.workers}",
+                 f"seq2anim_rejected_total {self.metrics['rejected']}",
+                 f"seq2anim_converted_total {self.metrics['converted']}",
+                 f"seq2anim_convert_seconds_sum {self.metrics['convert_seconds']:.3f}",
+                 f"seq2anim_bytes_in_total {self.metrics['bytes_in']}",
+                 f"seq2anim_bytes_out_total {self.metrics['bytes_out']}"]
+        for status, count in sorted(self.metrics["requests"].items()):
+            lines.append(f'seq2anim_requests_total{{status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, bind_host=None, bind_port=None):
+        server = await asyncio.start_server(self.handle, bind_host or host, bind_port or port)
+        async with server:
+            print(f"🎬 转换服务已启动: http://{bind_host or host}:{bind_port or port} "
+                  f"（{self.workers} 进程，最多 {self.capacity} 个并发请求）")
+            await server.serve_forever()
+
+    def restart_pool(self):
+        """替换已损坏的进程池（同一时刻失败的多个请求只替换一次）"""
+        if getattr(self.pool, "_broken", False):
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            print("⚠️ 转换进程异常退出，已重建进程池")
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    # 用法: curl --data-binary @sheet.png "http://127.0.0.1:8765/convert?fps=12&format=webp" -o out.webp
+    service = ConversionServer()
+    try:
+        asyncio.run(service.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -0,0 +1,203 @@
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+import zlib
+
+import sequence2anim
+
+# ========== 可调参数 ==========
+shared_folder = "/Volumes/shared/[需要处理的]"   # 共享输入文件夹（所有机器挂载同一路径）
+output_folder = "/Volumes/shared/output"        # 共享输出文件夹
+lease_seconds = 120                              # 租约超时（秒），超时未续约视为 worker 已崩溃
+local_workers = 1                                # 本机启动的 worker 进程数
+debug = True                                     # 是否打印调试信息
+# ==============================
+
+LEASE_DIR = ".leases"
+REPORT_DIR = ".reports"
+
+
+class Lease:
+    """基于 O_EXCL 创建的租约文件；后台线程定期 touch 续约"""
+
+    def __init__(self, path, worker_id):
+        self.path = path
+        self.worker_id = worker_id
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(self.worker_id)
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+        self._thread.start()
+        return True
+
+    def owner(self):
+        try:
+            with open(self.path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _renew(self):
+        while not self._stop.wait(lease_seconds / 3):
+            if self.owner() != self.worker_id:
+                # 租约被其他 worker 回收（本机曾长时间卡住），结果作废
+                self.lost = True
+                return
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def release(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if not self.lost and self.owner() == self.worker_id:
+            os.remove(self.path)
+
+
+def reclaim_stale(lease_path, worker_id):
+    """回收超时租约：先原子改名（只有一个 worker 能成功），再确认确实过期"""
+    try:
+        if time.time() - os.stat(lease_path).st_mtime < lease_seconds:
+            return False
+        stale_path = f"{lease_path}.stale.{worker_id}"
+        os.rename(lease_path, stale_path)
+    except FileNotFoundError:
+        return False
+    if time.time() - os.stat(stale_path).st_mtime < lease_seconds:
+        # 改名前一刻原主人刚续约，放回去
+        try:
+            os.link(stale_path, lease_path)
+        except FileExistsError:
+            pass
+        os.remove(stale_path)
+        return False
+    os.remove(stale_path)
+    return True
+
+
+def write_atomic_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def run_worker(worker_id):
+    """循环认领共享目录中的文件直到全部完成，返回本分片的吞吐报告"""
+    lease_dir = os.path.join(output_folder, LEASE_DIR)
+    report_dir = os.path.join(output_folder, REPORT_DIR)
+    os.makedirs(lease_dir, exist_ok=True)
+    os.makedirs(report_dir, exist_ok=True)
+
+    report = {"worker": worker_id, "files": 0, "skipped": 0, "failed": 0, "reclaimed": 0,
+              "lost": 0, "input_bytes": 0, "output_bytes": 0, "seconds": 0.0}
+    started = time.perf_counter()
+
+    files = sorted(f for f in os.listdir(shared_folder) if f.lower().endswith(".png"))
+    # 各 worker 从不同位置开始扫描，减少抢同一个文件
+    offset = zlib.crc32(worker_id.encode()) % len(files) if files else 0
+    files = files[offset:] + files[:offset]
+
+    while True:
+        progressed = False
+        pending = False
+        for file in files:
+            done_marker = os.path.join(lease_dir, f"{file}.done")
+            failed_marker = os.path.join(lease_dir, f"{file}.failed")
+            if os.path.exists(done_marker) or os.path.exists(failed_marker):
+                continue
+            pending = True
+            lease_path = os.path.join(lease_dir, f"{file}.lease")
+            lease = Lease(lease_path, worker_id)
+            if not lease.acquire():
+                if not reclaim_stale(lease_path, worker_id) or not lease.acquire():
+                    continue
+                report["reclaimed"] += 1
+                if debug:
+                    print(f"[{worker_id}] 回收超时租约: {file}")
+            # 拿到租约后再确认一次，避免与刚完成的 worker 重复处理
+            if os.path.exists(done_marker):
+                lease.release()
+                continue
+
+            progressed = True
+            filepath = os.path.join(shared_folder, file)
+            final_path = sequence2anim.output_path(filepath, output_folder)
+            tmp_path = f"{final_path}.{worker_id}.tmp"
+            try:
+                outpath = sequence2anim.split_and_animate(filepath, tmp_path)
+                if lease.lost:
+                    report["lost"] += 1
+                    if outpath:
+                        os.remove(tmp_path)
+                    continue
+                if outpath:
+                    os.replace(tmp_path, final_path)
+                    report["files"] += 1
+                    report["output_bytes"] += os.path.getsize(final_path)
+                else:
+                    report["skipped"] += 1
+                report["input_bytes"] += os.path.getsize(filepath)
+                with open(done_marker, "w") as f:
+                    f.write(worker_id)
+            except Exception as e:
+                report["failed"] += 1
+                print(f"[{worker_id}] ❌ {file}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                # 失败的文件不再重试，删除 .failed 标记即可重新排队
+                with open(failed_marker, "w", encoding="utf-8") as f:
+                    f.write(f"{worker_id}: {e}")
+            finally:
+                lease.release()
+
+        if not pending:
+            break
+        if not progressed:
+            # 剩余文件都被其他 worker 持有，等待它们完成或租约超时
+            time.sleep(lease_seconds / 6)
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["files_per_second"] = round(report["files"] / report["seconds"], 3) if report["seconds"] else 0.0
+    report["input_mb_per_second"] = (round(report["input_bytes"] / 1e6 / report["seconds"], 3)
+                                     if report["seconds"] else 0.0)
+    write_atomic_json(os.path.join(report_dir, f"{worker_id}.json"), report)
+    print(f"[{worker_id}] ✅ {report['files']} 个文件，{report['seconds']}s，"
+          f"{report['files_per_second']} 文件/秒")
+    return report
+
+
+def _worker_main(index):
+    run_worker(f"{socket.gethostname()}-{os.getpid()}-{index}")
+
+
+if __name__ == "__main__":
+    if not os.path.exists(shared_folder):
+        print(f"错误: 输入文件夹不存在: {shared_folder}")
+        sys.exit(1)
+    os.makedirs(output_folder, exist_ok=True)
+
+    if local_workers <= 1:
+        _worker_main(0)
+    else:
+        processes = [multiprocessing.Process(target=_worker_main, args=(i,)) for i in range(local_workers)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+    print("🎬 全部处理完成。")
@@ -1,12 +1,299 @@
 import sys
 import os
+import math
+import threading
+from collections import OrderedDict
+
 import numpy as np
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QFileDialog, QPushButton,
                              QSpinBox, QFrame, QStatusBar, QSizePolicy)
 from PyQt6.QtGui import QPixmap, QImage, QPainter, QColor, QPen
-from PyQt6.QtCore import Qt, QTimer
-from PIL import Image
+from PyQt6.QtCore import Qt, QTimer, QThread, QRectF, QPointF, pyqtSignal
+
+from seq2anim import (Converter, GridSpec, Sheet, SheetCache, TilePyramid, Tracer, default_converter, grid_confidence,
+                      predict_layout)
+
+# ========== 可调参数 ==========
+sheet_cache_mb = 8192  # 解码后序列图的磁盘缓存上限 (MB)，0 为关闭（目录见 SEQ2ANIM_CACHE）
+tile_size = 256        # 原图画布的图块边长（像素）
+tile_cache_tiles = 256 # 最多缓存的图块数（每块 tile_size² × 4 字节）
+max_zoom = 16          # 最大放大倍数
+auto_accept_threshold = 0.9  # 网格置信度达到该值的图片在后台自动切分保存，None 为全部人工确认
+alpha_threshold = 28   # 检测网格和打分时的 alpha 阈值 (0-255)
+max_rows = 20          # 自动检测的最大行数
+max_cols = 20          # 自动检测的最大列数
+latency_hud = False    # 在原图画布左上角显示最近一次操作的分步耗时和预览帧间隔
+trace_file = None      # 写出 Chrome trace 文件（如 "spritesheet_trace.json"），可用 chrome://tracing 或 Perfetto 打开
+# ==============================
+
+sheet_cache = SheetCache(max_bytes=sheet_cache_mb * 2 ** 20) if sheet_cache_mb else None
+tracer = Tracer(trace_file, latency_hud)
+
+
+def suggest_grid(sheet, converter):
+    """边缘检测（批量脚本的方式）和投影计数各给出一个网格，返回置信度较高的 (网格, 置信度)"""
+    index = sheet.occupancy(alpha_threshold)  # 检测、打分、有效帧数和切帧共用同一张积分图
+    alpha = sheet.alpha
+    edge_grid = converter.detect(sheet, max_rows, max_cols, alpha_threshold)
+    layout = predict_layout(alpha)
+    scored = [(grid_confidence(alpha, grid, alpha_threshold, max_rows, max_cols, index, edge_grid, layout).score, grid)
+              for grid in {edge_grid, layout}]
+    score, grid = max(scored)
+    return grid, score
+
+
+class PyramidBuilder(QThread):
+    """后台生成缩略金字塔，每完成一级发出 level_ready"""
+    level_ready = pyqtSignal(object, int)
+
+    def __init__(self, pyramid):
+        super().__init__()
+        self.pyramid = pyramid
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        self.pyramid.build(lambda level: self.level_ready.emit(self.pyramid, level), self.cancel_event.is_set)
+
+
+class TriageWorker(QThread):
+    """后台逐个检测网格并打分：置信度足够的直接切分保存，其余交给人工确认"""
+    triaged = pyqtSignal(object, str, object, float, bool, str)  # worker, 文件名, 网格, 置信度, 是否已自动保存, 错误信息
+
+    def __init__(self, input_dir, output_dir, files, fps):
+        super().__init__()
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.files = files
+        self.fps = fps
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        # 整个队列共用一个转换器：检测的掩码缓冲区和编码线程池只建一次
+        with Converter() as converter:
+            for name in self.files:
+                if self.cancel_event.is_set():
+                    return
+                grid, score, saved, error = None, 0.0, False, ""
+                try:
+                    sheet = Sheet.open(os.path.join(self.input_dir, name), cache=sheet_cache)
+                    grid, score = suggest_grid(sheet, converter)
+                    if score >= auto_accept_threshold:
+                        frames = sheet.split(grid)
+                        if len(frames):
+                            out_name = f"{os.path.splitext(name)[0]}.webp"
+                            frames.save(os.path.join(self.output_dir, out_name), "webp", self.fps, loop=0,
+                                        workers=converter.workers, executor=converter.executor)
+                            saved = True
+                except Exception as e:
+                    saved, error = False, str(e) or type(e).__name__  # 读取或编码失败的图片交给人工处理
+                self.triaged.emit(self, name, grid, score, saved, error)
+
+
+class SheetCanvas(QWidget):
+    """可缩放、拖动的序列图画布
+
+    只取当前缩放级别下可见的图块绘制，网格线在视图坐标中绘制，
+    所以绘制耗时和内存只取决于窗口大小，与序列图尺寸无关。
+    滚轮缩放（以鼠标为中心），左键拖动平移，双击恢复适应窗口。
+    """
+
+    def __init__(self, message=""):
+        super().__init__()
+        self.message = message
+        self.pyramid = None
+        self.builder = None
+        self.retired = []            # 已取消但仍在运行的 PyramidBuilder，finished 之前必须保留引用
+        self.grid = None
+        self.scale = 1.0
+        self.origin = QPointF(0, 0)  # 视图左上角对应的原图坐标
+        self.fit_mode = True
+        self.drag_pos = None
+        self.tiles = OrderedDict()   # (level, tx, ty) → (QImage, 是否精确)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setMinimumSize(200, 200)
+
+    def set_message(self, message):
+        self.set_sheet(None)
+        self.message = message
+        self.update()
+
+    def set_sheet(self, sheet):
+        self.stop_builder()
+        self.tiles.clear()
+        self.pyramid = TilePyramid(sheet.array, tile_size) if sheet is not None else None
+        if self.pyramid is not None:
+            self.builder = PyramidBuilder(self.pyramid)
+            self.builder.level_ready.connect(self.on_level_ready)
+            self.builder.finished.connect(self.on_builder_finished)
+            self.builder.start()
+        self.fit()
+
+    def stop_builder(self):
+        """取消当前的金字塔生成（在两级之间停止）
+
+        线程还在运行时放进 retired，直到 finished 才释放：QThread 在 run() 中被销毁会使程序直接中止。
+        """
+        if self.builder is not None:
+            self.builder.cancel_event.set()
+            if self.builder.isRunning():
+                self.retired.append(self.builder)
+            self.builder = None
+
+    def on_builder_finished(self):
+        builder = self.sender()
+        if builder in self.retired:
+            builder.wait()  # finished 在线程退出前发出，等它真正结束再释放
+            self.retired.remove(builder)
+
+    def shutdown(self):
+        """关闭窗口前调用：取消并等待所有仍在运行的金字塔线程"""
+        self.stop_builder()
+        for builder in self.retired:
+            builder.wait()
+        self.retired.clear()
+
+    def set_grid(self, grid):
+        self.grid = grid
+        self.update()
+
+    def on_level_ready(self, pyramid, level):
+        if pyramid is not self.pyramid:
+            return
+        # 丢弃该层级之前用隔点取样得到的近似图块
+        for key in [k for k, (_, exact) in self.tiles.items() if k[0] == level and not exact]:
+            del self.tiles[key]
+        self.update()
+
+    def fit(self):
+        self.fit_mode = True
+        if self.pyramid is not None:
+            w, h = self.pyramid.size
+            self.scale = min(self.width() / w, self.height() / h)
+            self.origin = QPointF((w - self.width() / self.scale) / 2, (h - self.height() / self.scale) / 2)
+        self.update()
+
+    def zoom_at(self, factor, pos):
+        if self.pyramid is None:
+            return
+        w, h = self.pyramid.size
+        min_scale = min(self.width() / w, self.height() / h, 1)
+        scale = max(min_scale, min(max_zoom, self.scale * factor))
+        # 缩放前后鼠标下的原图坐标保持不变
+        anchor = self.origin + pos / self.scale
+        self.scale = scale
+        self.origin = anchor - pos / scale
+        self.fit_mode = False
+        self.update()
+
+    def tile_image(self, level, tx, ty):
+        key = (level, tx, ty)
+        cached = self.tiles.get(key)
+        if cached is not None:
+            self.tiles.move_to_end(key)
+            return cached[0]
+        arr, exact = self.pyramid.tile(level, tx, ty)
+        image = QImage(arr.tobytes(), arr.shape[1], arr.shape[0], arr.strides[0], QImage.Format.Format_RGBA8888).copy()
+        self.tiles[key] = (image, exact)
+        while len(self.tiles) > tile_cache_tiles:
+            self.tiles.popitem(last=False)
+        return image
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0))
+        if self.pyramid is None:
+            painter.setPen(QColor(212, 212, 212))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self.message)
+            return
+
+        with tracer.span("paint"):
+            with tracer.span("tiles"):
+                self.paint_tiles(painter)
+            if self.grid is not None:
+                with tracer.span("grid"):
+                    self.paint_grid(painter)
+        if latency_hud:
+            self.paint_hud(painter)
+        painter.end()
+
+    def paint_tiles(self, painter):
+        level = self.pyramid.level_for_scale(self.scale)
+        step = 1 << level
+        span = tile_size * step  # 一个图块覆盖的原图像素
+        cols, rows = self.pyramid.tile_grid(level)
+        view_w, view_h = self.width() / self.scale, self.height() / self.scale
+        tx0, ty0 = max(0, int(self.origin.x() // span)), max(0, int(self.origin.y() // span))
+        tx1 = min(cols, int(math.ceil((self.origin.x() + view_w) / span)))
+        ty1 = min(rows, int(math.ceil((self.origin.y() + view_h) / span)))
+
+        # 放大到超过原始分辨率时不做插值，方便看清像素和网格是否对齐
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, self.scale * step < 1)
+        for ty in range(ty0, ty1):
+            for tx in range(tx0, tx1):
+                image = self.tile_image(level, tx, ty)
+                target = QRectF((tx * span - self.origin.x()) * self.scale,
+                                (ty * span - self.origin.y()) * self.scale,
+                                image.width() * step * self.scale, image.height() * step * self.scale)
+                painter.drawImage(target, image)
+
+    def paint_grid(self, painter):
+        pen = QPen(QColor(255, 0, 0, 150))
+        pen.setWidth(1)
+        painter.setPen(pen)
+        w, h = self.pyramid.size
+        frame_w, frame_h = self.grid.cell_size((w, h))
+        top = (0 - self.origin.y()) * self.scale
+        bottom = (h - self.origin.y()) * self.scale
+        left = (0 - self.origin.x()) * self.scale
+        right = (w - self.origin.x()) * self.scale
+        for i in range(1, self.grid.cols):
+            x = (i * frame_w - self.origin.x()) * self.scale
+            if 0 <= x <= self.width():
+                painter.drawLine(QPointF(x, top), QPointF(x, bottom))
+        for j in range(1, self.grid.rows):
+            y = (j * frame_h - self.origin.y()) * self.scale
+            if 0 <= y <= self.height():
+                painter.drawLine(QPointF(left, y), QPointF(right, y))
+
+    def paint_hud(self, painter):
+        """左上角叠加显示延迟信息（显示的是上一次绘制及之前的耗时）"""
+        lines = tracer.summary_lines()
+        if not lines:
+            return
+        metrics = painter.fontMetrics()
+        line_h = metrics.height()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 10
+        painter.fillRect(QRectF(0, 0, width, line_h * len(lines) + 6), QColor(0, 0, 0, 180))
+        painter.setPen(QColor(255, 255, 0))
+        for i, line in enumerate(lines):
+            painter.drawText(5, 3 + metrics.ascent() + i * line_h, line)
+
+    def wheelEvent(self, event):
+        self.zoom_at(1.25 ** (event.angleDelta().y() / 120), event.position())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drag_pos = event.position()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_pos is not None:
+            delta = event.position() - self.drag_pos
+            self.drag_pos = event.position()
+            self.origin -= delta / self.scale
+            self.fit_mode = False
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_pos = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.fit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.fit_mode:
+            self.fit()
 
 
 class ImageSplitterApp(QMainWindow):
@@ -21,6 +308,10 @@ class ImageSplitterApp(QMainWindow):
         self.current_idx = 0
         self.frames = []
         self.preview_frame_idx = 0
+        self.all_files = []
+        self.suggested = {}       # 文件名 → 后台检测出的网格
+        self.triage = None
+        self.auto_saved = 0
 
         self.init_ui()
 
@@ -52,9 +343,7 @@ class ImageSplitterApp(QMainWindow):
         self.setCentralWidget(central_widget)
         main_layout = QHBoxLayout(central_widget)
 
-        self.source_view = QLabel("1. 点击右侧选择输入文件夹\n2. 点击右侧设置输出目录\n3. 方向键调整，Enter保存")
-        self.source_view.setObjectName("PreviewLabel")
-        self.source_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.source_view = SheetCanvas("1. 点击右侧选择输入文件夹\n2. 点击右侧设置输出目录\n3. 方向键调整，Enter保存\n（滚轮缩放，拖动平移，双击适应窗口）")
         self.source_view.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         main_layout.addWidget(self.source_view, stretch=3)
 
@@ -116,21 +405,6 @@ class ImageSplitterApp(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
 
-    def predict_layout(self, pil_img):
-        img_array = np.array(pil_img)
-        if img_array.shape[2] < 4: return 1, 1
-        alpha = img_array[:, :, 3]
-
-        def count_segments(projection):
-            binary = (projection > 0).astype(int)
-            if not np.any(binary): return 1
-            changes = np.diff(binary, prepend=0, append=0)
-            return len(np.where(changes == 1)[0])
-
-        row_p = np.max(alpha, axis=1)
-        col_p = np.max(alpha, axis=0)
-        return max(1, min(50, count_segments(row_p))), max(1, min(50, count_segments(col_p)))
-
     def select_input_dir(self):
         path = QFileDialog.getExistingDirectory(self, "选择素材文件夹")
         if path:
@@ -141,12 +415,15 @@ class ImageSplitterApp(QMainWindow):
                 return
 
             self.input_dir = path
+            self.all_files = files
             self.image_files = files
             self.current_idx = 0
             self.btn_input.setText(f"输入: {os.path.basename(path)}")
             self.btn_input.setProperty("active", "true")
             self.refresh_styles()
-            self.load_image()
+            # 自动处理会重置队列并自己加载第一张，这里不必先解码一次
+            if not self.start_triage():
+                self.load_image()
 
     def select_output_dir(self):
         path = QFileDialog.getExistingDirectory(self, "选择输出文件夹")
@@ -155,6 +432,58 @@ class ImageSplitterApp(QMainWindow):
             self.btn_output.setText(f"输出: {os.path.basename(path)}")
             self.btn_output.setProperty("active", "true")
             self.refresh_styles()
+            self.start_triage()
+
+    def start_triage(self):
+        """输入输出都设置好后，先在后台自动处理置信度高的图片，人工只确认剩下的；返回是否已开始"""
+        if auto_accept_threshold is None or not (self.input_dir and self.output_dir and self.all_files):
+            return False
+        self.stop_triage()
+        self.image_files = []
+        self.current_idx = 0
+        self.suggested = {}
+        self.auto_saved = 0
+        self.triage = TriageWorker(self.input_dir, self.output_dir, list(self.all_files), self.fps)
+        self.triage.triaged.connect(self.on_triaged)
+        self.triage.finished.connect(self.on_triage_finished)
+        self.triage.start()
+        self.load_image()
+        return True
+
+    def stop_triage(self):
+        if self.triage is not None:
+            self.triage.cancel_event.set()
+            self.triage.wait()
+            self.triage = None
+
+    def on_triaged(self, worker, name, grid, score, saved, error):
+        if worker is not self.triage:
+            return
+        if error:
+            print(f"❌ 自动处理失败 {name}: {error}")
+            self.status_bar.showMessage(f"自动处理失败，转为人工确认: {name}（{error}）", 5000)
+        if saved:
+            self.auto_saved += 1
+            self.status_bar.showMessage(f"自动保存: {name}（置信度 {score:.2f}）", 2000)
+        else:
+            if grid is not None:
+                self.suggested[name] = grid
+            waiting = self.current_idx >= len(self.image_files)
+            self.image_files.append(name)
+            self.refresh_styles()
+            if waiting:
+                self.load_image()
+                return
+        self.update_info()
+
+    def on_triage_finished(self):
+        if self.triage is None or self.triage.isRunning():
+            return
+        self.triage = None
+        if self.current_idx >= len(self.image_files):
+            self.load_image()
+        else:
+            self.update_info()
 
     def refresh_styles(self):
         is_ready = bool(self.input_dir and self.output_dir and self.image_files)
@@ -168,17 +497,33 @@ class ImageSplitterApp(QMainWindow):
         if 0 <= self.current_idx < len(self.image_files):
             file_path = os.path.join(self.input_dir, self.image_files[self.current_idx])
             try:
-                self.pil_img = Image.open(file_path).convert("RGBA")
-                self.rows, self.cols = self.predict_layout(self.pil_img)
-                self.update_logic()
+                with tracer.span("load_image"):
+                    with tracer.span("decode"):
+                        self.sheet = Sheet.open(file_path, cache=sheet_cache)
+                        self.pil_img = self.sheet.image
+                    with tracer.span("occupancy"):
+                        self.sheet.occupancy(alpha_threshold)  # 按检测阈值只建一张，之后改行列时切帧只需查表
+                    suggested = self.suggested.get(self.image_files[self.current_idx])
+                    with tracer.span("suggest_grid"):
+                        self.rows, self.cols = suggested or suggest_grid(self.sheet, default_converter())[0]
+                    with tracer.span("set_sheet"):
+                        self.source_view.set_sheet(self.sheet)
+                    self.update_logic()
             except Exception as e:
                 self.status_bar.showMessage(f"读取图片失败: {e}", 3000)
+        elif self.triage is not None:
+            self.pil_img = None
+            self.frames = []
+            self.source_view.set_message("正在自动处理，等待需要确认的图片…")
+            self.anim_view.clear()
+            self.update_info()
         else:
             self.pil_img = None
             self.frames = []
-            self.source_view.setText("处理完毕！")
+            self.source_view.set_message("处理完毕！")
             self.anim_view.clear()
-            self.info_label.setText("所有图片已处理完成")
+            self.info_label.setText("所有图片已处理完成" +
+                                    (f"<br><b>自动通过:</b> {self.auto_saved}" if self.auto_saved else ""))
 
     def update_logic(self):
         # 【修复核心】增加所有关键变量的有效性检查
@@ -187,47 +532,41 @@ class ImageSplitterApp(QMainWindow):
         if not self.image_files or self.current_idx >= len(self.image_files):
             return
 
-        w, h = self.pil_img.size
-        q_img = QImage(self.pil_img.tobytes(), w, h, QImage.Format.Format_RGBA8888)
-        pixmap = QPixmap.fromImage(q_img)
-        painter = QPainter(pixmap)
-        pen = QPen(QColor(255, 0, 0, 150))
-        pen.setWidth(max(1, w // 600))
-        painter.setPen(pen)
-
-        cw, ch = w / self.cols, h / self.rows
-        for i in range(1, self.cols):
-            painter.drawLine(int(i * cw), 0, int(i * cw), h)
-        for j in range(1, self.rows):
-            painter.drawLine(0, int(j * ch), w, int(j * ch))
-        painter.end()
-
-        self.source_view.setPixmap(pixmap.scaled(self.source_view.size(),
-                                                 Qt.AspectRatioMode.KeepAspectRatio,
-                                                 Qt.TransformationMode.SmoothTransformation))
-
-        self.frames = []
-        icw, ich = int(w // self.cols), int(h // self.rows)
-        if icw > 0 and ich > 0:
-            for r in range(self.rows):
-                for c in range(self.cols):
-                    box = (c * icw, r * ich, (c + 1) * icw, (r + 1) * ich)
-                    frame = self.pil_img.crop(box)
-                    if frame.getbbox(): self.frames.append(frame)
-
+        with tracer.span("update_logic"):
+            grid = GridSpec(self.rows, self.cols)
+            self.source_view.set_grid(grid)
+            with tracer.span("split"):
+                self.frames = self.sheet.split(grid)
+            with tracer.span("update_info"):
+                self.update_info()
+
+    def update_info(self):
+        triage = ""
+        if self.triage is not None or self.auto_saved:
+            pending = " （后台处理中）" if self.triage is not None else ""
+            triage = f"<br><b>自动通过:</b> {self.auto_saved}/{len(self.all_files)}{pending}"
+        if self.current_idx >= len(self.image_files) or self.pil_img is None:
+            self.info_label.setText(f"<b>待确认:</b> 0{triage}")
+            return
         self.info_label.setText(f"<b>当前文件:</b> {self.image_files[self.current_idx]}<br>"
                                 f"<b>当前网格:</b> {self.rows}x{self.cols}<br>"
                                 f"<b>有效帧数:</b> {len(self.frames)}<br>"
-                                f"<b>进度:</b> {self.current_idx + 1}/{len(self.image_files)}")
+                                f"<b>进度:</b> {self.current_idx + 1}/{len(self.image_files)}{triage}")
 
     def update_animation_preview(self):
         if not self.frames:
             return
         self.preview_frame_idx = (self.preview_frame_idx + 1) % len(self.frames)
         f = self.frames[self.preview_frame_idx]
-        q_img = QImage(f.tobytes(), f.size[0], f.size[1], QImage.Format.Format_RGBA8888)
-        self.anim_view.setPixmap(QPixmap.fromImage(q_img).scaled(
-            self.anim_view.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        with tracer.span("preview_frame"):
+            with tracer.span("crop"):
+                q_img = QImage(np.ascontiguousarray(f).tobytes(), f.shape[1], f.shape[0], QImage.Format.Format_RGBA8888)
+            with tracer.span("scale"):
+                self.anim_view.setPixmap(QPixmap.fromImage(q_img).scaled(
+                    self.anim_view.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        tracer.frame("preview")
+        if latency_hud:
+            self.source_view.update()
 
     def on_fps_changed(self):
         self.fps = self.spin_fps.value()
@@ -240,8 +579,7 @@ class ImageSplitterApp(QMainWindow):
         try:
             name = os.path.splitext(self.image_files[self.current_idx])[0]
             save_path = os.path.join(self.output_dir, f"{name}.webp")
-            self.frames[0].save(save_path, save_all=True, append_images=self.frames[1:],
-                                duration=1000 // self.fps, loop=0, lossless=True)
+            self.frames.save(save_path, "webp", self.fps, loop=0)
             self.status_bar.showMessage(f"已保存: {name}.webp", 2000)
             self.current_idx += 1
             self.load_image()
@@ -270,10 +608,11 @@ class ImageSplitterApp(QMainWindow):
 
         self.update_logic()
 
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        if hasattr(self, 'pil_img') and self.pil_img:
-            self.update_logic()
+    def closeEvent(self, event):
+        self.stop_triage()
+        self.source_view.shutdown()
+        tracer.close()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
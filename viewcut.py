@@ -1,21 +1,29 @@
 import os
-import numpy as np
-from PIL import Image
 import pygame
 import sys
 
+from seq2anim import EXTENSIONS, GridSpec, Sheet, SheetCache, Tracer, default_converter
+
 # ========== 可调参数 ==========
 input_folder = "/Users/nayuchuanmei/Documents/剪映贴纸"  # 输入文件夹路径
 output_folder = "output"  # 输出文件夹路径
 fps = 12  # 动画帧率
-format = "webp"  # 可选 "webp" 或 "apng"
+format = "webp"  # 可选 "webp"、"apng" 或 "gif"
 alpha_threshold = 28  # alpha 阈值 (0-255)
 max_rows = 20  # 最大行分割数
 max_cols = 20  # 最大列分割数
 debug = True  # 是否打印调试信息
+encode_workers = None  # WebP/APNG 并行编码线程数（None 为 CPU 核数）
+alpha_cleanup = None  # 编码前清理透明像素: None / "zero"（RGB清零）/ "bleed"（填充相邻颜色）
 preview_max_size = (1200, 800)  # 预览窗口最大尺寸
+sheet_cache_mb = 8192  # 解码后序列图的磁盘缓存上限 (MB)，0 为关闭（目录见 SEQ2ANIM_CACHE）
+latency_hud = False  # 在窗口左上角显示最近一次操作的分步耗时和帧间隔
+trace_file = None  # 写出 Chrome trace 文件（如 "viewcut_trace.json"），可用 chrome://tracing 或 Perfetto 打开
 # ==============================
 
+sheet_cache = SheetCache(max_bytes=sheet_cache_mb * 2 ** 20) if sheet_cache_mb else None
+tracer = Tracer(trace_file, latency_hud)
+
 os.makedirs(output_folder, exist_ok=True)
 
 
@@ -27,10 +35,12 @@ class ImageSplitter:
         self.current_index = 0
         self.rows = 1
         self.cols = 1
+        self.sheet = None
         self.original_image = None
         self.preview_image = None
         self.scaled_preview = None
         self.scale_factor = 1.0
+        self.frame_count = 0
         self.screen = None
         self.font = None
         self.finished = False  # 添加完成标志
@@ -41,8 +51,19 @@ class ImageSplitter:
             return False
 
         filepath = os.path.join(self.input_folder, self.image_files[self.current_index])
-        self.original_image = Image.open(filepath).convert("RGBA")
-        self.update_preview()
+        with tracer.span("load_image"):
+            with tracer.span("decode"):
+                self.sheet = Sheet.open(filepath, cache=sheet_cache)
+            if alpha_cleanup:
+                with tracer.span("cleanup"):
+                    cleaned = self.sheet.cleanup(alpha_threshold, alpha_cleanup)
+                if debug:
+                    print(f"🧹 {self.image_files[self.current_index]}: 清理 {cleaned} 个透明像素")
+            with tracer.span("occupancy"):
+                # 先清理再建积分图：清理改了 alpha 会使已建的积分图失效，只建一次
+                self.sheet.occupancy(alpha_threshold)  # 按检测阈值只建一张，之后改行列时有效帧数只需查表
+            self.original_image = self.sheet.image
+            self.update_preview()
         return True
 
     def calculate_scale_factor(self, img_size):
@@ -61,35 +82,43 @@ class ImageSplitter:
         if self.original_image is None:
             return
 
-        w, h = self.original_image.size
+        with tracer.span("update_preview"):
+            w, h = self.original_image.size
+
+            # 计算缩放比例
+            self.calculate_scale_factor((w, h))
+            scaled_w = int(w * self.scale_factor)
+            scaled_h = int(h * self.scale_factor)
 
-        # 计算缩放比例
-        self.calculate_scale_factor((w, h))
-        scaled_w = int(w * self.scale_factor)
-        scaled_h = int(h * self.scale_factor)
+            # 创建带网格线的预览图像
+            with tracer.span("copy"):
+                preview = self.original_image.copy()
 
-        # 创建带网格线的预览图像
-        preview = self.original_image.copy()
+            # 转换为Pygame可用的格式
+            with tracer.span("to_surface"):
+                preview_rgb = preview.convert("RGB")
+                preview_surface = pygame.image.fromstring(preview_rgb.tobytes(), preview_rgb.size, preview_rgb.mode)
 
-        # 转换为Pygame可用的格式
-        preview_rgb = preview.convert("RGB")
-        preview_surface = pygame.image.fromstring(preview_rgb.tobytes(), preview_rgb.size, preview_rgb.mode)
+            # 绘制网格线到原尺寸图像
+            with tracer.span("grid"):
+                grid_surface = pygame.Surface((w, h), pygame.SRCALPHA)
+                frame_w = w // self.cols
+                frame_h = h // self.rows
 
-        # 绘制网格线到原尺寸图像
-        grid_surface = pygame.Surface((w, h), pygame.SRCALPHA)
-        frame_w = w // self.cols
-        frame_h = h // self.rows
+                for i in range(1, self.rows):
+                    pygame.draw.line(grid_surface, (255, 0, 0, 128), (0, i * frame_h), (w, i * frame_h), 2)
+                for j in range(1, self.cols):
+                    pygame.draw.line(grid_surface, (255, 0, 0, 128), (j * frame_w, 0), (j * frame_w, h), 2)
 
-        for i in range(1, self.rows):
-            pygame.draw.line(grid_surface, (255, 0, 0, 128), (0, i * frame_h), (w, i * frame_h), 2)
-        for j in range(1, self.cols):
-            pygame.draw.line(grid_surface, (255, 0, 0, 128), (j * frame_w, 0), (j * frame_w, h), 2)
+                # 将网格线合成到预览图像上
+                preview_surface.blit(grid_surface, (0, 0))
 
-        # 将网格线合成到预览图像上
-        preview_surface.blit(grid_surface, (0, 0))
+            with tracer.span("count_frames"):
+                self.frame_count = self.sheet.frame_count(GridSpec(self.rows, self.cols))
 
-        # 缩放预览图像
-        self.scaled_preview = pygame.transform.smoothscale(preview_surface, (scaled_w, scaled_h))
+            # 缩放预览图像
+            with tracer.span("scale"):
+                self.scaled_preview = pygame.transform.smoothscale(preview_surface, (scaled_w, scaled_h))
 
     def get_display_rect(self, screen_width, screen_height):
         """获取图像在窗口中的显示位置（居中显示）"""
@@ -120,47 +149,18 @@ class ImageSplitter:
         if self.original_image is None:
             return
 
-        w, h = self.original_image.size
-        frame_w = w // self.cols
-        frame_h = h // self.rows
-
-        frames = []
-        for y in range(self.rows):
-            for x in range(self.cols):
-                box = (x * frame_w, y * frame_h, (x + 1) * frame_w, (y + 1) * frame_h)
-                frame = self.original_image.crop(box)
-                arr = np.array(frame)
-                if np.all(arr[..., 3] == 0):  # 跳过完全透明帧
-                    continue
-                frames.append(frame)
-
-        if not frames:
+        converter = default_converter(encode_workers)
+        with tracer.span("split"):
+            frames = self.sheet.split(GridSpec(self.rows, self.cols))
+
+        if not len(frames):
             print(f"⚠️ 跳过 {self.image_files[self.current_index]}（无有效帧）")
             return
 
-        duration = int(1000 / fps)
         filename = os.path.splitext(self.image_files[self.current_index])[0]
-        outpath = os.path.join(self.output_folder, f"{filename}.{'webp' if format == 'webp' else 'png'}")
-
-        if format == "webp":
-            frames[0].save(
-                outpath,
-                save_all=True,
-                append_images=frames[1:],
-                duration=duration,
-                loop=0,
-                disposal=2,
-                lossless=True
-            )
-        else:
-            # 对于APNG格式，这里简化处理，实际使用时需要安装apng库
-            frames[0].save(
-                outpath,
-                save_all=True,
-                append_images=frames[1:],
-                duration=duration,
-                loop=0
-            )
+        outpath = os.path.join(self.output_folder, f"{filename}.{EXTENSIONS[format]}")
+        with tracer.span("encode"):
+            frames.save(outpath, format, fps, loop=0, workers=converter.workers, executor=converter.executor)
 
         print(f"✅ {filename}: {self.cols}x{self.rows} 网格 → {len(frames)}帧，{fps}fps → {outpath}")
 
@@ -268,7 +268,7 @@ class ImageSplitter:
                 self.screen.blit(text_surface, text_rect)
 
                 # 第二行：当前状态
-                status_text = f"Iamge: {self.current_index + 1}/{len(self.image_files)} | FileName: {self.image_files[self.current_index]} | Splitting: {self.cols}×{self.rows} | Scale: {self.scale_factor:.1%}"
+                status_text = f"Iamge: {self.current_index + 1}/{len(self.image_files)} | FileName: {self.image_files[self.current_index]} | Splitting: {self.cols}×{self.rows} | Frames: {self.frame_count} | Scale: {self.scale_factor:.1%}"
                 status_surface = self.small_font.render(status_text, True, (200, 200, 200))
                 status_rect = status_surface.get_rect(center=(screen_width//2, info_y + 50))
                 self.screen.blit(status_surface, status_rect)
@@ -281,9 +281,14 @@ class ImageSplitter:
                     size_rect = size_surface.get_rect(center=(screen_width//2, info_y + 75))
                     self.screen.blit(size_surface, size_rect)
 
+            if latency_hud:
+                tracer.draw_hud(self.screen, self.small_font)
+
             pygame.display.flip()
+            tracer.frame()
 
         pygame.quit()
+        tracer.close()
         print("🎬 All Done。")
 
 
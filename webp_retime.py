@@ -0,0 +1,204 @@
+import argparse
+import os
+import struct
+import sys
+
+from PIL import Image
+
+from seq2anim import encode_webp_animation, iter_animation, write_bytes
+from seq2anim.webp import index_chunks
+
+# ========== 可调参数 ==========
+fps = None             # 新的动画帧率（None 保持每帧原有时长）
+loop = None            # 循环次数（0 为无限循环，None 保持原值）
+order = "forward"      # 帧顺序: "forward" / "reverse" / "pingpong"
+force = False          # 帧之间有依赖时仍调整顺序：解码成完整画面后无损重新编码（否则跳过并返回非零）
+debug = True           # 是否打印调试信息
+# ==============================
+
+COPY_BLOCK = 1 << 16
+ANMF_DISPOSE_BACKGROUND = 0x01
+ANMF_NO_BLEND = 0x02
+
+
+class DependentFramesError(ValueError):
+    """帧之间有依赖（混合或不清除背景），直接调整 ANMF 顺序会改变画面"""
+
+
+def _copy(src, dst, offset, size):
+    src.seek(offset)
+    remaining = size
+    while remaining:
+        block = src.read(min(COPY_BLOCK, remaining))
+        if not block:
+            raise ValueError("文件被截断")
+        dst.write(block)
+        remaining -= len(block)
+
+
+def _padded(size):
+    return 8 + size + (size & 1)
+
+
+def _uint24(data):
+    return data[0] | data[1] << 8 | data[2] << 16
+
+
+def frames_independent(headers, canvas):
+    """每帧的画面是否只取决于它自己的数据（调整顺序后仍然逐像素一致）
+
+    每帧都必须不混合；并且要么每帧都“显示后清除为背景”（下一帧总是画在空画布上），
+    要么每帧都覆盖整个画布。libwebp 默认编码出的增量帧不满足，seq2anim 写出的动画满足。
+    """
+    if not all(h[15] & ANMF_NO_BLEND for h in headers):
+        return False
+    if all(h[15] & ANMF_DISPOSE_BACKGROUND for h in headers):
+        return True
+    return canvas is not None and all(
+        _uint24(h[0:3]) == 0 and _uint24(h[3:6]) == 0 and (_uint24(h[6:9]) + 1, _uint24(h[9:12]) + 1) == canvas
+        for h in headers)
+
+
+def frame_order(count, order):
+    if order == "reverse":
+        return list(range(count - 1, -1, -1))
+    if order == "pingpong":
+        return list(range(count)) + list(range(count - 2, 0, -1))
+    return list(range(count))
+
+
+def reencode_webp(src_path, out_path, duration=None, loop=None, order="forward"):
+    """解码成完整画面后按新顺序无损重新编码（帧之间有依赖时使用），返回 (原帧数, 新帧数)"""
+    durations = []
+    frames = list(iter_animation(src_path, durations))
+    if loop is None:
+        with Image.open(src_path) as img:
+            loop = img.info.get("loop", 0)
+    indices = frame_order(len(frames), order)
+    delays = [duration] * len(indices) if duration is not None else [durations[i] for i in indices]
+    write_bytes(out_path, encode_webp_animation((frames[i] for i in indices), delays, loop))
+    return len(frames), len(indices)
+
+
+def retime_webp(src_path, dst_path, duration=None, loop=None, order="forward", force=False):
+    """直接改写 RIFF 容器中的 ANMF 时长、ANIM 循环次数和帧顺序，不重新编码
+
+    图像数据按 64KB 分块从原文件拷贝，内存占用与文件大小无关。
+    只有各帧互不依赖时才直接调整 ANMF 顺序（见 frames_independent），否则抛出
+    DependentFramesError；force 为 True 时改为解码后无损重新编码。
+    先写入 <目标>.tmp，成功后原子替换，失败时删除临时文件。返回 (原帧数, 新帧数)。
+    """
+    out_path = f"{dst_path}.tmp"
+    try:
+        result = _retime(src_path, out_path, duration, loop, order, force)
+    except BaseException:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+    os.replace(out_path, dst_path)
+    return result
+
+
+def _retime(src_path, out_path, duration, loop, order, force):
+    with open(src_path, "rb") as src:
+        chunks = index_chunks(src)
+        frames = [c for c in chunks if c[0] == b"ANMF"]
+        if not frames:
+            raise ValueError(f"{os.path.basename(src_path)} 不是动画 WebP")
+
+        # 读取每帧 16 字节的 ANMF 头
+        headers = []
+        for _, offset, _ in frames:
+            src.seek(offset)
+            headers.append(bytearray(src.read(16)))
+
+        if any(len(h) < 16 for h in headers):
+            raise ValueError("文件被截断")
+        indices = frame_order(len(frames), order)
+        if order != "forward":
+            vp8x = next((c for c in chunks if c[0] == b"VP8X"), None)
+            canvas = None
+            if vp8x is not None:
+                src.seek(vp8x[1] + 4)
+                size = src.read(6)
+                canvas = (_uint24(size[0:3]) + 1, _uint24(size[3:6]) + 1) if len(size) == 6 else None
+            if not frames_independent(headers, canvas):
+                if not force:
+                    raise DependentFramesError("帧之间有依赖（增量帧），直接调整顺序会破坏画面；使用 --force 解码后重新编码")
+                return reencode_webp(src_path, out_path, duration, loop, order)
+
+        before = chunks[:chunks.index(frames[0])]
+        after = chunks[chunks.index(frames[-1]) + 1:]
+        riff_size = 4 + sum(_padded(c[2]) for c in before + after) + sum(_padded(frames[i][2]) for i in indices)
+
+        with open(out_path, "wb") as dst:
+            dst.write(b"RIFF" + struct.pack("<I", riff_size) + b"WEBP")
+            for fourcc, offset, size in before:
+                dst.write(fourcc + struct.pack("<I", size))
+                if fourcc == b"ANIM" and loop is not None:
+                    src.seek(offset)
+                    anim = bytearray(src.read(size))
+                    anim[4:6] = struct.pack("<H", loop)
+                    dst.write(anim)
+                else:
+                    _copy(src, dst, offset, size)
+                if size & 1:
+                    dst.write(b"\x00")
+            for i in indices:
+                _, offset, size = frames[i]
+                header = bytearray(headers[i])
+                if duration is not None:
+                    header[12:15] = struct.pack("<I", min(int(duration), 0xFFFFFF))[:3]
+                dst.write(b"ANMF" + struct.pack("<I", size) + header)
+                _copy(src, dst, offset + 16, size - 16)
+                if size & 1:
+                    dst.write(b"\x00")
+            for fourcc, offset, size in after:
+                dst.write(fourcc + struct.pack("<I", size))
+                _copy(src, dst, offset, size)
+                if size & 1:
+                    dst.write(b"\x00")
+    return len(frames), len(indices)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="不重新编码，直接修改动画 WebP 的帧率、循环次数和帧顺序")
+    parser.add_argument("paths", nargs="+", help="WebP 文件或包含 WebP 的文件夹")
+    parser.add_argument("--fps", type=float, default=fps, help="新的帧率（默认保持每帧原有时长）")
+    parser.add_argument("--duration", type=int, help="每帧时长（毫秒），优先于 --fps")
+    parser.add_argument("--loop", type=int, default=loop, help="循环次数，0 为无限循环（默认保持原值）")
+    parser.add_argument("--order", choices=["forward", "reverse", "pingpong"], default=order)
+    parser.add_argument("--force", action="store_true", default=force,
+                        help="帧之间有依赖时解码后无损重新编码（默认跳过该文件）")
+    parser.add_argument("--output", help="输出文件夹（默认原地改写）")
+    args = parser.parse_args(argv)
+
+    duration = args.duration
+    if duration is None and args.fps:
+        duration = int(1000 / args.fps)
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith(".webp"))
+        else:
+            files.append(path)
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    failed = 0
+    for path in files:
+        dst = os.path.join(args.output, os.path.basename(path)) if args.output else path
+        try:
+            before, after = retime_webp(path, dst, duration, args.loop, args.order, args.force)
+        except (ValueError, struct.error, OSError) as e:
+            print(f"❌ 跳过 {os.path.basename(path)}（{e}）")
+            failed += 1
+            continue
+        if debug:
+            timing = f"{duration}ms/帧" if duration is not None else "保持原时长"
+            print(f"✅ {os.path.basename(path)}: {before}帧 → {after}帧，{timing} → {dst}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())